@@ -37,8 +37,10 @@ Requires:		gridsite%{?_isa} >= 1.7
 Requires:		httpd%{?_isa}
 Requires:		mod_wsgi
 Requires:		python-fts
+Requires:		python-jsonschema >= 0.8
 Requires:		python-paste-deploy
 Requires:		python-pylons
+Requires:		python-sqlalchemy >= 0.8.2
 
 %description
 This package provides the FTS3 REST interface
@@ -71,6 +73,8 @@ rm -rf %{buildroot}
 %defattr(-,root,root,-)
 %{python_sitearch}/*
 %{_libexecdir}/fts3
+%{_sbindir}/fts-rest-migrate
+%{_sbindir}/fts-rest-repair-counters
 %config(noreplace) %{_sysconfdir}/fts3/fts3rest.ini
 %config(noreplace) %{_sysconfdir}/httpd/conf.d/fts3rest.conf
 
@@ -32,7 +32,7 @@ BuildRequires:	python26-devel
 BuildRequires:	python-devel
 %endif
 
-Requires:		python-sqlalchemy
+Requires:		python-sqlalchemy >= 0.8.2
 
 %description
 This package provides an object model of the FTS3
@@ -101,12 +101,18 @@ class JobSubmitter(Base):
 	
 		if jobId and self.options.blocking:
 			inquirer = Inquirer(self.context)
-			while True:
-				time.sleep(self.options.poll_interval)
-				job = inquirer.getJobStatus(jobId)
-				if job['job_state'] not in ['SUBMITTED', 'READY', 'STAGING', 'ACTIVE']:
-					break
+			job = inquirer.getJobStatus(jobId)
+			while job['job_state'] in ['SUBMITTED', 'READY', 'STAGING', 'ACTIVE']:
 				self.logger.info("Job in state %s" % job['job_state'])
+				# The server holds the request until the state changes
+				start = time.time()
+				previous = job['job_state']
+				job = inquirer.getJobStatus(jobId, wait = self.options.poll_interval,
+											sinceState = previous)
+				# Servers that do not support waiting answer right away
+				elapsed = time.time() - start
+				if job['job_state'] == previous and elapsed < self.options.poll_interval:
+					time.sleep(self.options.poll_interval - elapsed)
 			
 			self.logger.info("Job finished with state %s" % job['job_state'])
 			if job['reason']:
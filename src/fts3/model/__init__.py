@@ -2,8 +2,10 @@ import sqlalchemy
 from base        import Base
 from banned      import *
 from config      import *
+from counters    import *
 from credentials import *
 from file        import *
+from idempotency import *
 from job         import *
 from version     import *
 
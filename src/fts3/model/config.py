@@ -70,12 +70,12 @@ class Se(Base):
 	
 	standalone_source = relation('LinkConfig', backref = None,
 								 primaryjoin = and_(LinkConfig.source == name, LinkConfig.destination == '*'),
-								 foreign_keys = (name),
+								 foreign_keys = (name), uselist = True,
 								 lazy = 'dynamic')
 	
 	standalone_destination = relation('LinkConfig', backref = None,
 									  primaryjoin = and_(LinkConfig.destination == name, LinkConfig.source == '*'),
-									  foreign_keys = (name),
+									  foreign_keys = (name), uselist = True,
 									  lazy = 'dynamic')
 	
 	def __str__(self):
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String
+
+from base import Base
+
+
+class QueueCounter(Base):
+	__tablename__ = 't_queue_counter'
+	
+	source_se  = Column(String(255), primary_key = True)
+	dest_se    = Column(String(255), primary_key = True)
+	vo_name    = Column(String(50), primary_key = True)
+	file_state = Column(String(32), primary_key = True)
+	count      = Column(Integer)
+	
+	def __str__(self):
+		return "%s => %s (%s, %s): %d" % (self.source_se, self.dest_se, self.vo_name,
+										  self.file_state, self.count)
@@ -1,5 +1,5 @@
 from sqlalchemy import Column, DateTime, Float
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import ForeignKey, Index, Integer, String
 
 from base import Base, Json
 
@@ -42,6 +42,8 @@ class File(Base):
 	selection_strategy   = Column(String(255))
 	bringonline_token    = Column(String(255))
 	
+	__table_args__ = (Index('idx_file_job_state', 'job_id', 'file_state'),)
+	
 	def isFinished(self):
 		return self.job_state not in FileActiveStates
 	
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, Index, String
+
+from base import Base
+
+
+class IdempotencyKey(Base):
+	__tablename__ = 't_idempotency_key'
+	
+	dlg_id          = Column(String(100), primary_key = True)
+	idempotency_key = Column(String(255), primary_key = True)
+	job_id          = Column(String(36))
+	expiration      = Column(DateTime)
+	
+	__table_args__ = (Index('idx_idempotency_expiration', 'expiration'),)
+	
+	def __str__(self):
+		return "%s/%s" % (self.dlg_id, self.idempotency_key)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, Integer, String 
+from sqlalchemy import Column, DateTime, Index, Integer, String 
 from sqlalchemy.orm import relation, backref
 
 from base import Base, Flag, Json
@@ -41,6 +41,14 @@ class Job(Base):
 	files = relation("File", uselist = True, lazy = True,
 					 backref = backref("job", lazy = True))
 	
+	__table_args__ = (
+		# Keyset pagination of the jobs in a given state
+		Index('idx_job_state_submit_time', 'job_state', 'submit_time', 'job_id'),
+		Index('idx_job_state_vo', 'job_state', 'vo_name'),
+		# MySQL can not index the whole user_dn
+		Index('idx_job_state_user', 'job_state', 'user_dn', mysql_length = {'user_dn': 255}),
+	)
+	
 	def isFinished(self):
 		return self.job_state not in JobActiveStates
 	
@@ -9,13 +9,33 @@ class Inquirer(object):
 		self.context = context
 
 
-	def getJobStatus(self, jobId):
+	def getJobStatus(self, jobId, wait = None, sinceState = None):
+		"""
+		If wait is given, the server holds the answer up to that many seconds,
+		until the job leaves sinceState (by default, its current state)
+		"""
+		url = "/jobs/%s" % jobId
+		if wait:
+			url += "?wait=%d" % wait
+			if sinceState:
+				url += "&since_state=%s" % urllib.quote(sinceState, '')
 		try:
-			return json.loads(self.context.get("/jobs/%s" % jobId))
+			return json.loads(self.context.get(url))
 		except NotFound:
 			raise NotFound(jobId)
 
 
+	def getJobsStatus(self, jobIds, files = True):
+		"""
+		Returns a dictionary job id => job for all the given ids, in one
+		request. Jobs not found, or not accessible, map to an error message.
+		"""
+		url = "/jobs/status"
+		if not files:
+			url += "?files=false"
+		return json.loads(self.context.post_json(url, json.dumps(jobIds)))
+
+
 	def getJobList(self, userDn = None, voName = None):
 		url = "/jobs?" 	
 		args = {}
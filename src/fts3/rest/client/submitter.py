@@ -25,6 +25,10 @@ class Submitter(object):
 		
 		job['files'].append(transfer)		
 		
+		# Retrying with the same key does not create a new job
+		idempotencyKey = kwargs.pop('idempotency_key', None)
+		if idempotencyKey:
+			job['idempotency_key'] = idempotencyKey
 		
 		job['params'] = dict()
 		job['params'].update(kwargs)
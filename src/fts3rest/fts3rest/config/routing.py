@@ -24,6 +24,9 @@ def make_map(config):
 	# Whoami
 	map.connect('/whoami', controller='misc', action='whoami')
 	
+	# Internal state, for monitoring
+	map.connect('/monitoring', controller='misc', action='monitoring')
+	
 	# Delegation
 	map.connect('/delegation/{id}', controller='delegation', action='view')
 	map.connect('/delegation/{id}/{action}', controller='delegation')
@@ -33,15 +36,31 @@ def make_map(config):
 				conditions = dict(method = ['GET']))
 	map.connect('/jobs/', controller='jobs', action='index',
 				conditions = dict(method = ['GET']))
+	map.connect('/jobs/bulk', controller='jobs', action='submitBulk',
+				conditions = dict(method = ['POST']))
+	map.connect('/jobs/stream', controller='jobs', action='submitStream',
+				conditions = dict(method = ['POST']))
+	map.connect('/jobs/events', controller='jobs', action='events',
+				conditions = dict(method = ['GET']))
+	map.connect('/jobs/status', controller='jobs', action='status',
+				conditions = dict(method = ['GET', 'POST']))
 	map.connect('/jobs/{id}', controller='jobs', action='show',
 				conditions = dict(method = ['GET']))
+	map.connect('/jobs/{id}/files', controller='jobs', action='showFiles',
+				conditions = dict(method = ['GET']))
 	map.connect('/jobs/{id}/{field}', controller='jobs', action='showField',
 				conditions = dict(method = ['GET']))
 	map.connect('/jobs/{id}', controller='jobs', action='cancel',
 				conditions = dict(method = ['DELETE']))
+	map.connect('/jobs', controller='jobs', action='cancelMany',
+				conditions = dict(method = ['DELETE']))
 	map.connect('/jobs', controller='jobs', action='submit',
 			    conditions = dict(method = ['PUT', 'POST']))
 	
+	# Summary
+	map.connect('/summary', controller='summary', action='index')
+	map.connect('/summary/queue', controller='summary', action='queue')
+	
 	# Schema definition
 	map.connect('/schema/{action}', controller='schema')
 	
@@ -10,7 +10,6 @@ class ConfigController(BaseController):
 	@authorize(CONFIG)
 	@jsonify
 	def audit(self, **kwargs):
-		auditList = Session.query(ConfigAudit)
-		return list(auditList)
+		return Session.query(ConfigAudit)
 
 	
\ No newline at end of file
@@ -4,7 +4,7 @@ from fts3rest.lib.helpers import jsonify
 from M2Crypto import X509, RSA, EVP, BIO
 from pylons.controllers.util import abort
 from pylons.decorators import rest
-from pylons import request
+from pylons import app_globals, request
 import pytz
 import uuid
 
@@ -113,6 +113,9 @@ class DelegationController(BaseController):
 		Session.merge(credential)
 		Session.commit()
 		
+		# The cached termination time is not valid anymore
+		app_globals.credentialCache.invalidate((id, user.user_dn))
+		
 		start_response('201 CREATED', [])
 		
 		return ''
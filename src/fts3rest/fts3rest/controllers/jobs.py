@@ -1,13 +1,31 @@
 from datetime import datetime, timedelta
-from fts3.model import Job, File, JobActiveStates
-from fts3.model import Credential, BannedSE
+from fts3.model import Job, File, JobActiveStates, FileActiveStates
+from fts3.model import Credential, BannedSE, IdempotencyKey
 from fts3rest.lib.base import BaseController, Session
-from fts3rest.lib.helpers import jsonify
+from fts3rest.lib.bulk import CHUNK_SIZE, insertJobs, insertRows, rowFromObject
+from fts3rest.lib.cancel import cancelJobs
+from fts3rest.lib.counters import adjustCounters, countFile
+from fts3rest.lib.migration import existingTables
+from fts3rest.lib.paging import getPageSize, encodeCursor, decodeCursor, setNextLink
+from fts3rest.lib.jsonstream import JSONObjectStream, JSONStreamError
+from fts3rest.lib.schema import submissionError, transferError, paramsError
+from fts3rest.lib.helpers import ClassEncoder, jsonify, iterQuery
+from fts3rest.lib.projection import getFields, Projection
 from fts3rest.lib.middleware.fts3auth import authorize, authorized
 from fts3rest.lib.middleware.fts3auth.constants import *
-from pylons import request
+from paste.deploy.converters import asbool, asint
+from pylons import app_globals, config, request, response
 from pylons.controllers.util import abort
+from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from webob.exc import HTTPNotModified
+import hashlib
 import json
+import logging
+import Queue
+import random
 import re
 import socket
 import types
@@ -28,22 +46,129 @@ DEFAULT_PARAMS = {
 	'spacetoken'       : ''
 }
 
+CURSOR_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Fraction of the submissions with an idempotency key that purge the expired ones
+IDEMPOTENCY_PURGE_RATE = 0.01
+
+log = logging.getLogger(__name__)
+
 
 class JobsController(BaseController):
 	
-	def _getJob(self, id):
-		job = Session.query(Job).get(id)
+	def __before__(self):
+		# Controllers are instantiated per request, so is this cache.
+		# It is bounded by the number of distinct scheme pairs.
+		self._compatibleSchemes = {}
+	
+	def _getJob(self, id, files = False):
+		"""Returns the job. If files is True, they are loaded in the same query"""
+		query = Session.query(Job)
+		if files:
+			query = query.options(joinedload(Job.files))
+		job = query.get(id)
+		self._checkJobAccess(id, job)
+		return job
+	
+	def _getProjectedJob(self, id, projection):
+		"""Returns only the columns of the job selected by projection"""
+		job = Session.query(*projection.columns).filter(Job.job_id == id).first()
+		self._checkJobAccess(id, job)
+		return job
+	
+	def _checkJobAccess(self, id, job):
 		if job is None:
 			abort(404, 'No job with the id "%s" has been found' % id)
 		if not authorized(TRANSFER, resource_owner = job.user_dn, resource_vo = job.vo_name):
 			abort(403, 'Not enough permissions to check the job "%s"' % id)
+	
+	def _getVersionTag(self, id):
+		"""
+		Returns a tag that changes whenever the job, or any of its files,
+		changes state, is reprioritized, or a file starts or finishes a
+		transfer. There is no modification time in the schema, so changes
+		that touch none of those (i.e. the file size or the throughput of an
+		active transfer) are not noticed: the tag is weak.
+		"""
+		job = Session.query(Job.job_state, Job.job_finished, Job.finish_time, Job.priority,
+							Job.user_dn, Job.vo_name)\
+			.filter(Job.job_id == id).first()
+		self._checkJobAccess(id, job)
+		# The sum of the ids tells apart two files swapping states
+		fileStates = Session.query(File.file_state, func.count(File.file_id), func.sum(File.file_id),
+								   func.max(File.start_time), func.max(File.finish_time))\
+			.filter(File.job_id == id).group_by(File.file_state).order_by(File.file_state).all()
+		version = (job.job_state, job.job_finished, job.finish_time, job.priority, map(tuple, fileStates))
+		return hashlib.md5(repr(version)).hexdigest()
+	
+	def _checkModified(self, id):
+		"""Sets the ETag, and raises 304 if the client has that same version"""
+		tag = self._getVersionTag(id)
+		etag = 'W/"%s"' % tag
+		# Weak tags are matched by hand, WebOb 0.9 ignores them
+		clientTags = [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]
+		if etag in clientTags or '"%s"' % tag in clientTags:
+			raise HTTPNotModified(headers = [('ETag', etag)])
+		response.headers['ETag'] = etag
+	
+	def _waitForChange(self, id):
+		"""
+		If asked with 'wait', holds the request until the job leaves the state
+		'since_state' (by default, the current one), or the time expires
+		"""
+		if 'wait' not in request.params:
+			return
+		try:
+			timeout = int(request.params['wait'])
+		except ValueError:
+			abort(400, 'Invalid wait "%s"' % request.params['wait'])
+		if timeout < 0:
+			abort(400, 'The wait time can not be negative')
+		timeout = min(timeout, asint(config.get('fts3.MaxWait', 60)))
+		
+		job = Session.query(Job.job_state, Job.user_dn, Job.vo_name).filter(Job.job_id == id).first()
+		self._checkJobAccess(id, job)
+		sinceState = request.params.get('since_state', job.job_state)
+		if job.job_state != sinceState or timeout == 0:
+			return
+		
+		# Do not hold a database connection while waiting
+		Session.close()
+		app_globals.jobWatcher.wait(id, sinceState, timeout)
+	
+	def _getProjectedFiles(self, id, projection):
+		"""Returns the files of the job, with only the columns selected by projection"""
+		files = Session.query(*projection.columns).filter(File.job_id == id).order_by(File.file_id)
+		return map(projection.toDict, files)
+	
+	def _getQueuedJob(self, id):
+		"""
+		Returns the job if it has been accepted but not stored yet, or if it
+		could not be stored at all (then its state is FAILED). None otherwise
+		"""
+		job = app_globals.jobWriter.get(id)
+		if job is not None:
+			response.status_int = 202
+		else:
+			job = app_globals.jobWriter.getFailed(id)
+		if job is not None:
+			if not authorized(TRANSFER, resource_owner = job.user_dn, resource_vo = job.vo_name):
+				abort(403, 'Not enough permissions to check the job "%s"' % id)
 		return job
 		
 	@authorize(TRANSFER)
 	@jsonify
 	def index(self, **kwargs):
 		"""GET /jobs: All jobs in the collection"""
-		jobs = Session.query(Job).filter(Job.job_state.in_(JobActiveStates))
+		# Only the columns asked are loaded
+		fields = getFields(request)
+		projection = None
+		if fields is not None:
+			projection = Projection(Job, fields, required = ['job_id', 'submit_time'])
+			jobs = Session.query(*projection.columns)
+		else:
+			jobs = Session.query(Job)
+		jobs = jobs.filter(Job.job_state.in_(JobActiveStates))
 		
 		# Filtering
 		if 'user_dn' in request.params and request.params['user_dn']:
@@ -51,58 +176,304 @@ class JobsController(BaseController):
 		if 'vo_name' in request.params and request.params['vo_name']:
 			jobs = jobs.filter(Job.vo_name == request.params['vo_name'])
 		
-		# Return
-		return jobs.all()
+		# Pagination, if asked, uses the position of the last job of the
+		# previous page, so any page costs the same
+		limit = getPageSize(request, asint(config.get('fts3.MaxPageSize', 1000)))
+		if limit is None:
+			if projection is not None:
+				return (projection.toDict(job) for job in iterQuery(jobs))
+			return jobs
+		
+		if request.params.get('after', None):
+			(submitTime, jobId) = decodeCursor(request.params['after'], 2)
+			try:
+				submitTime = datetime.strptime(submitTime, CURSOR_TIME_FORMAT)
+			except (ValueError, TypeError):
+				abort(400, 'Invalid cursor')
+			jobs = jobs.filter(or_(Job.submit_time > submitTime,
+								   and_(Job.submit_time == submitTime, Job.job_id > jobId)))
+		
+		page = jobs.order_by(Job.submit_time, Job.job_id).limit(limit + 1).all()
+		if len(page) > limit:
+			page = page[:limit]
+			last = page[-1]
+			setNextLink(request, response,
+						encodeCursor([last.submit_time.strftime(CURSOR_TIME_FORMAT), last.job_id]))
+		if projection is not None:
+			return map(projection.toDict, page)
+		return page
 	
 	@jsonify
 	def cancel(self, id, **kwargs):
 		"""DELETE /jobs/id: Delete an existing item"""
-		job = self._getJob(id)
+		if app_globals.jobWriter.get(id) is not None:
+			abort(409, 'The job "%s" has not been stored yet, try again later' % id)
+		job = Session.query(Job.job_id, Job.job_state, Job.vo_name, Job.user_dn)\
+			.filter(Job.job_id == id).first()
+		self._checkJobAccess(id, job)
 		
 		if job.job_state in JobActiveStates:
-			now = datetime.now()
-			
-			job.job_state    = 'CANCELED'
-			job.finish_time  = now
-			job.job_finished = now
-			job.reason       = 'Job canceled by the user'
-			
-			for f in job.files:
-				if f.file_state in JobActiveStates:
-					f.file_state   = 'CANCELED'
-					f.job_finished = now
-					f.finish_time  = now
-					f.reason       = 'Job canceled by the user'
-				
-			Session.merge(job)
-			Session.commit()
-			
-			job = self._getJob(id)
-
-		files = job.files
-		return job
+			# Set based updates, so the cost does not depend on the number of files
+			try:
+				cancelJobs(Session, [id], 'Job canceled by the user')
+				Session.commit()
+			except:
+				Session.rollback()
+				raise
+		
+		# Loaded after the updates, with its files, in a single query
+		return self._getJob(id, files = True)
+	
+	@authorize(TRANSFER)
+	@jsonify
+	def cancelMany(self, **kwargs):
+		"""DELETE /jobs: Cancels all the active jobs matching vo_name, user_dn, source_se and/or dest_se"""
+		filters = dict([(k, request.params[k]) for k in ('vo_name', 'user_dn', 'source_se', 'dest_se')
+						if request.params.get(k, None)])
+		if not filters:
+			abort(400, 'At least one of vo_name, user_dn, source_se or dest_se is required')
+		
+		jobs = Session.query(Job.job_id).filter(Job.job_state.in_(JobActiveStates))
+		if 'vo_name' in filters:
+			jobs = jobs.filter(Job.vo_name == filters['vo_name'])
+		if 'user_dn' in filters:
+			jobs = jobs.filter(Job.user_dn == filters['user_dn'])
+		# Jobs with several storages have no source_se or dest_se, so look into the files
+		for (key, column) in (('source_se', File.source_se), ('dest_se', File.dest_se)):
+			if key in filters:
+				jobs = jobs.filter(Job.job_id.in_(
+					Session.query(File.job_id).filter(column == filters[key])\
+						.filter(File.file_state.in_(FileActiveStates)).subquery()))
+		
+		# Restrict to what the user can cancel
+		user  = request.environ['fts3.User.Credentials']
+		level = user.getGrantedLevelFor(TRANSFER)
+		if level == VO:
+			if 'vo_name' in filters and not user.hasVo(filters['vo_name']):
+				abort(403, 'Not enough permissions to cancel the jobs of "%s"' % filters['vo_name'])
+			jobs = jobs.filter(Job.vo_name.in_(user.vos))
+		elif level == PRIVATE:
+			if filters.get('user_dn', user.user_dn) != user.user_dn:
+				abort(403, 'Not enough permissions to cancel the jobs of "%s"' % filters['user_dn'])
+			jobs = jobs.filter(Job.user_dn == user.user_dn)
+		
+		reason = 'Job canceled by the user (%s)' % ', '.join(['%s=%s' % i for i in sorted(filters.iteritems())])
+		return self._cancelChunks(jobs, reason, asint(config.get('fts3.CancelChunkSize', 100)))
+	
+	def _cancelChunks(self, jobs, reason, chunkSize):
+		"""
+		Generates the progress of the cancellation of the jobs, one chunk per
+		transaction, so the tables are never locked for long.
+		It runs while the response is sent, so it uses a session of its own.
+		"""
+		session = Session.session_factory()
+		jobs    = jobs.with_session(session)
+		progress = {'chunks': 0, 'jobs_canceled': 0, 'files_canceled': 0, 'done': False}
+		try:
+			while True:
+				chunk = [j.job_id for j in jobs.limit(chunkSize)]
+				if not chunk:
+					break
+				try:
+					(nJobs, nFiles) = cancelJobs(session, chunk, reason)
+					session.commit()
+				except Exception, e:
+					session.rollback()
+					log.exception('Failed to cancel a chunk of jobs')
+					progress['error'] = str(e)
+					break
+				progress['chunks']         += 1
+				progress['jobs_canceled']  += nJobs
+				progress['files_canceled'] += nFiles
+				# Nothing could be canceled, do not insist
+				if not nJobs:
+					break
+				yield dict(progress)
+		finally:
+			session.close()
+		progress['done'] = 'error' not in progress
+		yield progress
 	
 	@jsonify
 	def show(self, id, **kwargs):
 		"""GET /jobs/id: Show a specific item"""
-		job = self._getJob(id)
-		files = job.files # Trigger the query, so it is serialized
-		return job
+		fields     = getFields(request)
+		fileFields = getFields(request, 'files')
+		
+		# Look first into the queue, since the job leaves it once it is stored
+		job = self._getQueuedJob(id)
+		if job is not None:
+			if fields is None:
+				return job
+			projected = Projection(Job, fields).toDict(job)
+			if fileFields:
+				projected['files'] = map(Projection(File, fileFields).toDict, job.files)
+			return projected
+		
+		# Nothing else is loaded if the client has already the last version
+		self._waitForChange(id)
+		self._checkModified(id)
+		
+		if fields is None:
+			return self._getJob(id, files = True)
+		
+		# Projection: only the columns asked are queried
+		projection = Projection(Job, fields, required = ['user_dn', 'vo_name'])
+		projected = projection.toDict(self._getProjectedJob(id, projection))
+		if fileFields:
+			projected['files'] = self._getProjectedFiles(id, Projection(File, fileFields))
+		return projected
 	
 	@jsonify
 	def showField(self, id, field, **kwargs):
 		"""GET /jobs/id/field: Show a specific field from an item"""
-		job = self._getJob(id)
+		job = self._getQueuedJob(id)
+		if job is None:
+			self._checkModified(id)
+			job = self._getJob(id)
 		if hasattr(job, field):
 			return getattr(job, field)
 		else:
 			abort(404, 'No such field')
 	
+	@jsonify
+	def showFiles(self, id, **kwargs):
+		"""GET /jobs/id/files: Files of a job, optionally filtered by state and paginated"""
+		fields = getFields(request)
+		states = filter(None, request.params.get('file_state', '').split(','))
+		
+		job = self._getQueuedJob(id)
+		if job is not None:
+			files = [f for f in job.files if not states or f.file_state in states]
+			if fields is not None:
+				return map(Projection(File, fields).toDict, files)
+			return files
+		
+		# Checks the access too
+		self._checkModified(id)
+		
+		projection = None
+		if fields is not None:
+			projection = Projection(File, fields, required = ['file_id'])
+			files = Session.query(*projection.columns)
+		else:
+			files = Session.query(File)
+		files = files.filter(File.job_id == id)
+		if states:
+			files = files.filter(File.file_state.in_(states))
+		files = files.order_by(File.file_id)
+		
+		limit = getPageSize(request, asint(config.get('fts3.MaxPageSize', 1000)))
+		if limit is None:
+			page = files.all()
+		else:
+			if request.params.get('after', None):
+				(fileId,) = decodeCursor(request.params['after'], 1)
+				if not isinstance(fileId, (int, long)):
+					abort(400, 'Invalid cursor')
+				files = files.filter(File.file_id > fileId)
+			page = files.limit(limit + 1).all()
+			if len(page) > limit:
+				page = page[:limit]
+				setNextLink(request, response, encodeCursor([page[-1].file_id]))
+		
+		if projection is not None:
+			return map(projection.toDict, page)
+		return page
+	
 	@authorize(TRANSFER)
 	@jsonify
-	def submit(self, **kwargs):
-		"""PUT /jobs: Submits a new job"""
-		# First, the request has to be valid JSON
+	def status(self, **kwargs):
+		"""GET|POST /jobs/status: Status of several jobs at once, by id"""
+		if request.method == 'POST':
+			jobIds = self._getSubmittedBody()
+		else:
+			jobIds = filter(None, request.params.get('ids', '').split(','))
+		if type(jobIds) is not types.ListType or not all([isinstance(i, basestring) for i in jobIds]):
+			abort(400, 'Expected a list of job ids')
+		if len(jobIds) == 0:
+			abort(400, 'No job ids specified')
+		if len(jobIds) > asint(config.get('fts3.MaxPageSize', 1000)):
+			abort(400, 'Too many job ids')
+		withFiles = asbool(request.params.get('files', True))
+		
+		# Two queries per chunk: one for the jobs, one for their files
+		stored = {}
+		for i in xrange(0, len(jobIds), CHUNK_SIZE):
+			chunk = jobIds[i:i + CHUNK_SIZE]
+			for job in Session.query(Job).filter(Job.job_id.in_(chunk)):
+				stored[job.job_id] = job
+			if withFiles and stored:
+				files = {}
+				for file in Session.query(File).filter(File.job_id.in_(chunk)).order_by(File.file_id):
+					files.setdefault(file.job_id, []).append(file)
+				for jobId in chunk:
+					if jobId in stored:
+						set_committed_value(stored[jobId], 'files', files.get(jobId, []))
+		
+		statuses = {}
+		for jobId in jobIds:
+			job = stored.get(jobId, None) or app_globals.jobWriter.get(jobId) or\
+				  app_globals.jobWriter.getFailed(jobId)
+			if job is None:
+				statuses[jobId] = {'status': 404, 'message': 'No job with the id "%s" has been found' % jobId}
+			elif not authorized(TRANSFER, resource_owner = job.user_dn, resource_vo = job.vo_name):
+				statuses[jobId] = {'status': 403, 'message': 'Not enough permissions to check the job "%s"' % jobId}
+			else:
+				statuses[jobId] = job
+		return statuses
+	
+	@authorize(TRANSFER)
+	def events(self, **kwargs):
+		"""GET /jobs/events: Stream of state changes of jobs and files, as server-sent events"""
+		filters = {}
+		for key in ('vo_name', 'user_dn', 'source_se', 'dest_se'):
+			if request.params.get(key, None):
+				filters[key] = request.params[key]
+		
+		# The request is gone by the time the events are sent
+		env = request.environ
+		def match(event):
+			for (key, value) in filters.iteritems():
+				if getattr(event, key) != value:
+					return False
+			return authorized(TRANSFER, resource_owner = event.user_dn, resource_vo = event.vo_name, env = env)
+		
+		# Only what this user can see is looked at for this stream
+		scope = dict([(key, [value]) for (key, value) in filters.iteritems()])
+		user  = request.environ['fts3.User.Credentials']
+		level = user.getGrantedLevelFor(TRANSFER)
+		if level == VO:
+			if 'vo_name' in filters and not user.hasVo(filters['vo_name']):
+				abort(403, 'Not enough permissions to watch the jobs of "%s"' % filters['vo_name'])
+			scope.setdefault('vo_name', user.vos)
+		elif level == PRIVATE:
+			if filters.get('user_dn', user.user_dn) != user.user_dn:
+				abort(403, 'Not enough permissions to watch the jobs of "%s"' % filters['user_dn'])
+			scope['user_dn'] = [user.user_dn]
+		elif not scope:
+			scope = None
+		
+		lastEventId = request.headers.get('Last-Event-ID', request.params.get('last_event_id', None))
+		feed = app_globals.changeFeed
+		events = feed.listen(match, lastEventId, duration = asint(config.get('fts3.EventStreamDuration', 600)),
+							 scope = scope)
+		
+		response.headers['Content-Type']  = 'text/event-stream'
+		response.headers['Cache-Control'] = 'no-cache'
+		return self._formatEvents(feed, events)
+	
+	def _formatEvents(self, feed, events):
+		yield 'retry: %d\n\n' % (feed.interval * 1000)
+		for event in events:
+			if event is None:
+				yield ': keep-alive\n\n'
+			else:
+				yield 'id: %s\nevent: %s\ndata: %s\n\n' % (feed.eventId(event), event.type,
+															  json.dumps(event, cls = ClassEncoder))
+	
+	def _getSubmittedBody(self):
+		"""Returns the decoded JSON body of the request"""
 		try:
 			if request.method == 'PUT':
 				unencodedBody = request.body
@@ -114,22 +485,62 @@ class JobsController(BaseController):
 			else:
 				abort(400, 'Unsupported method %s' % request.method)
 				
-			submittedDict = json.loads(unencodedBody)
+			return json.loads(unencodedBody)
 						
 		except ValueError, e:
 			abort(400, 'Badly formatted JSON request (%s)' % str(e))
 
-		# The auto-generated delegation id must be valid
-		user = request.environ['fts3.User.Credentials']
-		credential = Session.query(Credential).get((user.delegation_id, user.user_dn))
-		if credential is None:
-			abort(403, 'No delegation id found for "%s"' % user.user_dn)
-		if credential.expired():
-			remaining = credential.remaining()
+
+	def _checkDelegation(self, user):
+		"""The auto-generated delegation id must be valid"""
+		# Only the termination time is cached, never the proxy.
+		# The cache is trusted only to accept: the credential may have been
+		# renewed through another process, so it is read again before refusing
+		minimum = timedelta(hours = 1)
+		key = (user.delegation_id, user.user_dn)
+		terminationTime = app_globals.credentialCache.get(key)
+		if terminationTime is None or terminationTime - datetime.now() < minimum:
+			credential = Session.query(Credential).get(key)
+			if credential is None:
+				abort(403, 'No delegation id found for "%s"' % user.user_dn)
+			terminationTime = credential.termination_time
+			app_globals.credentialCache.put(key, terminationTime)
+		
+		remaining = terminationTime - datetime.now()
+		if remaining <= timedelta(0):
 			seconds = abs(remaining.seconds + remaining.days * 24 * 3600)
 			abort(403, 'The delegated credentials expired %d seconds ago' % seconds)
-		if credential.remaining() < timedelta(hours = 1):
+		if remaining < minimum:
 			abort(403, 'The delegated credentials has less than one hour left')
+
+
+	def _abortIfInvalid(self, error):
+		if error is not None:
+			abort(400, 'Invalid request: %s' % error)
+
+
+	@authorize(TRANSFER)
+	@jsonify
+	def submit(self, **kwargs):
+		"""PUT /jobs: Submits a new job"""
+		# First, the request has to be valid JSON
+		submittedDict = self._getSubmittedBody()
+
+		user = request.environ['fts3.User.Credentials']
+		self._checkDelegation(user)
+		
+		# Reject malformed requests before building anything
+		self._abortIfInvalid(submissionError(submittedDict))
+		
+		# A retried submission gets the job created the first time
+		idempotencyKey = request.headers.get('Idempotency-Key', None) or\
+						 submittedDict.get('idempotency_key', None)
+		if idempotencyKey and not self._idempotencyEnabled():
+			idempotencyKey = None
+		if idempotencyKey:
+			previous = self._findIdempotentJob(user, idempotencyKey)
+			if previous is not None:
+				return previous
 		
 		# Populate the job and file
 		job = self._setupJobFromDict(submittedDict, user)
@@ -137,12 +548,212 @@ class JobsController(BaseController):
 		# Set job source and dest se depending on the transfers
 		self._setJobSourceAndDestination(job)
 		
-		# Return it
-		Session.merge(job)
+		if idempotencyKey:
+			lifetime = timedelta(hours = asint(config.get('fts3.IdempotencyKeyLifetime', 24)))
+			job._idempotency = IdempotencyKey(dlg_id          = user.delegation_id,
+											  idempotency_key = idempotencyKey,
+											  job_id          = job.job_id,
+											  expiration      = datetime.now() + lifetime)
+		
+		# In asynchronous mode, the job is stored later by the writer thread
+		if asbool(config.get('fts3.AsyncSubmit', False)):
+			try:
+				app_globals.jobWriter.put(job)
+			except Queue.Full:
+				abort(503, 'Too many submissions waiting to be stored, try again later')
+			response.status_int = 202
+			return job
+		
+		# Insert it. The job id is brand new, so there is no need for
+		# the identity lookups merge would do
+		try:
+			insertJobs(Session, [job])
+			Session.commit()
+		except IntegrityError:
+			# Someone else just stored the same key
+			Session.rollback()
+			if idempotencyKey:
+				previous = self._findIdempotentJob(user, idempotencyKey)
+				if previous is not None:
+					return previous
+			raise
+			
+		return job
+
+
+	def _idempotencyEnabled(self):
+		"""
+		Keys are ignored if the schema has not been migrated yet.
+		Checked only once per process
+		"""
+		if app_globals.idempotencyEnabled is None:
+			enabled = IdempotencyKey.__tablename__ in existingTables(Session.get_bind())
+			if not enabled:
+				log.warning('%s does not exist, idempotency keys are ignored until fts-rest-migrate is run '
+							'and the service restarted' % IdempotencyKey.__tablename__)
+			app_globals.idempotencyEnabled = enabled
+		return app_globals.idempotencyEnabled
+
+
+	def _findIdempotentJob(self, user, key):
+		"""
+		Returns the id of the job submitted before with the same key, or
+		None if there is none
+		"""
+		queued = app_globals.jobWriter.getByKey(user.delegation_id, key)
+		if queued is not None:
+			response.status_int = 202
+			return {'job_id': queued.job_id}
+		
+		now    = datetime.now()
+		record = Session.query(IdempotencyKey).get((user.delegation_id, key))
+		if record is not None and record.expiration > now:
+			return {'job_id': record.job_id}
+		
+		# Expired keys are forgotten when reused, so they can be stored again,
+		# and, once in a while, all at once, so they do not pile up
+		if record is not None:
+			Session.delete(record)
+			Session.commit()
+		elif random.random() < IDEMPOTENCY_PURGE_RATE:
+			table = IdempotencyKey.__table__
+			Session.execute(table.delete().where(table.c.expiration <= now))
+			Session.commit()
+		return None
+
+
+	@authorize(TRANSFER)
+	@jsonify
+	def submitBulk(self, **kwargs):
+		"""POST /jobs/bulk: Submits a list of jobs in one transaction"""
+		submittedList = self._getSubmittedBody()
+		if type(submittedList) is not types.ListType:
+			abort(400, 'Expected a list of jobs')
+		if len(submittedList) == 0:
+			abort(400, 'No jobs specified')
+		
+		# Only one delegation check for all of them
+		user = request.environ['fts3.User.Credentials']
+		self._checkDelegation(user)
+		
+		for submittedDict in submittedList:
+			self._abortIfInvalid(submissionError(submittedDict))
+		
+		jobs = []
+		for submittedDict in submittedList:
+			job = self._setupJobFromDict(submittedDict, user)
+			self._setJobSourceAndDestination(job)
+			jobs.append(job)
+		
+		# Batched inserts, one commit
+		insertJobs(Session, jobs)
 		Session.commit()
+		
+		# Report, per job, the transfers dropped because of banned storages
+		submitted = []
+		for job in jobs:
+			entry = {'job_id': job.job_id}
+			if getattr(job, 'dropped_transfers', None):
+				entry['dropped_transfers'] = job.dropped_transfers
+			submitted.append(entry)
+		return submitted
+
+
+	@authorize(TRANSFER)
+	@jsonify
+	def submitStream(self, **kwargs):
+		"""POST /jobs/stream: Submits a job, storing the transfers while they are read"""
+		if request.content_type != 'application/json':
+			abort(400, 'Only application/json is supported when streaming')
+		
+		user = request.environ['fts3.User.Credentials']
+		self._checkDelegation(user)
+		
+		stream = JSONObjectStream(request.environ['wsgi.input'], request.content_length,
+								  arrays = ['files'])
+		header  = dict()
+		job     = None
+		pending = []
+		findex  = 0
+		nFiles  = 0
+		droppedTransfers = []
+		deltas  = {}
+		try:
+			for (key, value) in stream:
+				if key != 'files':
+					if job is not None:
+						abort(400, 'The job parameters must precede the list of files')
+					header[key] = value
+					continue
+				
+				self._abortIfInvalid(transferError(value))
+				
+				# First transfer, so the job can be written
+				if job is None:
+					self._abortIfInvalid(paramsError(header.get('params', None)))
+					job = self._setupJob(header, user)
+					if job.copy_pin_lifetime > -1:
+						job.job_state = 'STAGING'
+					insertRows(Session, Job.__table__, [rowFromObject(job)])
+				
+				(allowed, dropped) = self._splitBanned(self._populateFiles(value, findex))
+				droppedTransfers.extend(dropped)
+				for file in allowed:
+					file.job_id     = job.job_id
+					file.file_state = job.job_state
+					if nFiles == 0:
+						job.source_se = file.source_se
+						job.dest_se   = file.dest_se
+					else:
+						if file.source_se != job.source_se:
+							job.source_se = None
+						if file.dest_se != job.dest_se:
+							job.dest_se = None
+					pending.append(rowFromObject(file))
+					countFile(deltas, file, job.vo_name)
+					nFiles += 1
+				findex += 1
+				
+				if len(pending) >= CHUNK_SIZE:
+					insertRows(Session, File.__table__, pending)
+					pending = []
+			
+			if job is None:
+				abort(400, 'No transfers specified')
+			if nFiles == 0:
+				if droppedTransfers:
+					abort(403, 'All the transfers involve banned storage elements')
+				abort(400, 'No pair with matching protocols')
 			
+			insertRows(Session, File.__table__, pending)
+			adjustCounters(Session, deltas)
+		
+		except JSONStreamError, e:
+			Session.rollback()
+			abort(400, 'Badly formatted JSON request (%s)' % str(e))
+		except ValueError:
+			Session.rollback()
+			abort(400, 'Invalid value within the request')
+		except TypeError, e:
+			Session.rollback()
+			abort(400, 'Malformed request: %s' % str(e))
+		except KeyError, e:
+			Session.rollback()
+			abort(400, 'Missing parameter: %s' % str(e))
+		except:
+			Session.rollback()
+			raise
+		
+		Session.execute(Job.__table__.update()
+						.where(Job.__table__.c.job_id == job.job_id)
+						.values(source_se = job.source_se, dest_se = job.dest_se))
+		Session.commit()
+		
+		if droppedTransfers:
+			job.dropped_transfers = droppedTransfers
 		return job
 
+
 	def _setJobSourceAndDestination(self, job):
 		job.source_se = job.files[0].source_se
 		job.dest_se   = job.files[0].dest_se
@@ -153,60 +764,74 @@ class JobsController(BaseController):
 				job.dest_se = None
 
 
+	def _setupJob(self, serialized, user):
+		"""Creates the job, without files, from the deserialized request"""
+		# Initialize defaults
+		# If the client is giving a NULL for a parameter with a default,
+		# use the default
+		params = dict()
+		params.update(DEFAULT_PARAMS)
+		if 'params' in serialized:
+			params.update(serialized['params'])
+			for (k, v) in params.iteritems():
+				if v is None and k in DEFAULT_PARAMS:
+					params[k] = DEFAULT_PARAMS[k]
+		
+		# Create
+		job = Job()
+		
+		# Job
+		job.job_id                   = str(uuid.uuid1())
+		job.job_state                = 'SUBMITTED'
+		job.reuse_job                = self._yesOrNo(params['reuse'])
+		job.job_params               = params['gridftp']
+		job.submit_host              = socket.getfqdn() 
+		job.user_dn                  = user.user_dn
+		
+		if 'credential' in serialized:
+			job.user_cred  = serialized['credential']
+			job.cred_id    = str()
+		else:
+			job.user_cred  = str()
+			job.cred_id    = user.delegation_id
+		
+		job.voms_cred                = ' '.join(user.voms_cred)
+		job.vo_name                  = user.vos[0]
+		job.submit_time              = datetime.now()
+		job.priority                 = 3
+		job.space_token              = params['spacetoken']
+		job.overwrite_flag           = self._yesOrNo(params['overwrite'])
+		job.source_space_token       = params['source_spacetoken'] 
+		job.copy_pin_lifetime        = int(params['copy_pin_lifetime'])
+		job.verify_checksum          = self._yesOrNo(params['verify_checksum'])
+		job.bring_online             = int(params['bring_online'])
+		job.job_metadata             = params['job_metadata']
+		job.job_params               = str()
+		return job
+
+
 	def _setupJobFromDict(self, serialized, user):
 		try:
 			if len(serialized['files']) == 0:
 				abort(400, 'No transfers specified')
-								
-			# Initialize defaults
-			# If the client is giving a NULL for a parameter with a default,
-			# use the default
-			params = dict()
-			params.update(DEFAULT_PARAMS)
-			if 'params' in serialized:
-				params.update(serialized['params'])
-				for (k, v) in params.iteritems():
-					if v is None and k in DEFAULT_PARAMS:
-						params[k] = DEFAULT_PARAMS[k]
-			
-			# Create
-			job = Job()
-			
-			# Job
-			job.job_id                   = str(uuid.uuid1())
-			job.job_state                = 'SUBMITTED'
-			job.reuse_job                = self._yesOrNo(params['reuse'])
-			job.job_params               = params['gridftp']
-			job.submit_host              = socket.getfqdn() 
-			job.user_dn                  = user.user_dn
-			
-			if 'credential' in serialized:
-				job.user_cred  = serialized['credential']
-				job.cred_id    = str()
-			else:
-				job.user_cred  = str()
-				job.cred_id    = user.delegation_id
 			
-			job.voms_cred                = ' '.join(user.voms_cred)
-			job.vo_name                  = user.vos[0]
-			job.submit_time              = datetime.now()
-			job.priority                 = 3
-			job.space_token              = params['spacetoken']
-			job.overwrite_flag           = self._yesOrNo(params['overwrite'])
-			job.source_space_token       = params['source_spacetoken'] 
-			job.copy_pin_lifetime        = int(params['copy_pin_lifetime'])
-			job.verify_checksum          = self._yesOrNo(params['verify_checksum'])
-			job.bring_online             = int(params['bring_online'])
-			job.job_metadata             = params['job_metadata']
-			job.job_params               = str()
+			job = self._setupJob(serialized, user)
 			
 			# Files
 			findex = 0
+			files  = []
 			for t in serialized['files']:
-				job.files.extend(self._populateFiles(t, findex))
+				files.extend(self._populateFiles(t, findex))
 				findex += 1
+			
+			(allowed, dropped) = self._splitBanned(files)
+			job.files.extend(allowed)
+			if dropped:
+				job.dropped_transfers = dropped
 				
 			if len(job.files) == 0:
+				if dropped:
+					abort(403, 'All the transfers involve banned storage elements')
 				abort(400, 'No pair with matching protocols')
 				
 			# If copy_pin_lifetime is specified, go to staging directly
@@ -225,35 +850,80 @@ class JobsController(BaseController):
 			abort(400, 'Missing parameter: %s' % str(e))
 
 
-	def _protocolMatchAndValid(self, src, dst):
+	def _protocolMatchAndValid(self, srcScheme, dstScheme):
 		forbiddenSchemes = ['', 'file']
-		return src.scheme not in forbiddenSchemes and\
-				dst.scheme not in forbiddenSchemes and\
-				(src.scheme == dst.scheme or src.scheme == 'srm' or dst.scheme == 'srm') 
+		return srcScheme not in forbiddenSchemes and\
+				dstScheme not in forbiddenSchemes and\
+				(srcScheme == dstScheme or srcScheme == 'srm' or dstScheme == 'srm') 
+
+
+	def _compatible(self, srcScheme, dstScheme):
+		"""Memoized _protocolMatchAndValid, evaluated once per scheme pair"""
+		key = (srcScheme, dstScheme)
+		if key not in self._compatibleSchemes:
+			self._compatibleSchemes[key] = self._protocolMatchAndValid(srcScheme, dstScheme)
+		return self._compatibleSchemes[key]
+
+
+	def _splitBanned(self, files):
+		"""
+		Returns the list of files that do not involve any banned storage,
+		and the description of those that do. Depending on fts3.BannedSEPolicy,
+		the latter are just dropped ('filter') or the request is refused ('reject')
+		"""
+		bannedSEs = app_globals.bannedSEs
+		bannedSEs.refresh()
+		
+		# Compare the distinct storages only, most of the times none will be banned
+		involved = set([f.source_se for f in files]) | set([f.dest_se for f in files])
+		banned   = involved & bannedSEs.banned
+		if not banned:
+			return (files, [])
+		
+		if config.get('fts3.BannedSEPolicy', 'filter') == 'reject':
+			abort(403, 'The storage elements %s are banned' % ', '.join(sorted(banned)))
+		
+		allowed = []
+		dropped = []
+		for f in files:
+			if f.source_se in banned or f.dest_se in banned:
+				dropped.append({'file_index':  f.file_index,
+								'source_surl': f.source_surl,
+								'dest_surl':   f.dest_surl})
+			else:
+				allowed.append(f)
+		return (allowed, dropped)
 
 
 	def _populateFiles(self, serialized, findex):
 		files = []
 		
-		# Extract matching pairs
+		# Extract matching pairs. Each distinct url of this transfer is parsed
+		# once; nothing is kept across transfers, so the memory used by
+		# huge (streamed) jobs does not grow with their number of transfers
+		parsed = {}
+		for url in serialized['sources'] + serialized['destinations']:
+			if url not in parsed:
+				parsed[url] = urlparse.urlparse(url)
+		sources      = [(s, parsed[s]) for s in serialized['sources']]
+		destinations = [(d, parsed[d]) for d in serialized['destinations']]
+		
 		pairs = []
-		for s in serialized['sources']:
-			for d in serialized['destinations']:
-				source_url = urlparse.urlparse(s)
-				dest_url   = urlparse.urlparse(d)
-				if self._protocolMatchAndValid(source_url, dest_url):
-					pairs.append((s, d))
+		for (s, source_url) in sources:
+			for (d, dest_url) in destinations:
+				if self._compatible(source_url.scheme, dest_url.scheme):
+					pairs.append((s, source_url, d, dest_url))
 					
 		# Create one File entry per matching pair
-		for (s, d) in pairs:
+		for (s, source_url, d, dest_url) in pairs:
 			file = File()
 			
 			file.file_index  = findex
 			file.file_state  = 'SUBMITTED'
 			file.source_surl = s
 			file.dest_surl   = d
-			file.source_se   = self._getSE(s)
-			file.dest_se     = self._getSE(d)
+			file.source_se   = self._getSE(source_url)
+			file.dest_se     = self._getSE(dest_url)
 			
 			file.user_filesize = serialized.get('filesize', None)
 			file.selection_strategy = serialized.get('selection_strategy', None)
@@ -269,9 +939,9 @@ class JobsController(BaseController):
 		return files
 	
 			
-	def _getSE(self, uri):
-		parsed = urlparse.urlparse(uri)
-		return "%s://%s" % (parsed.scheme, parsed.hostname)
+	def _getSE(self, parsed):
+		return app_globals.seCache.get((parsed.scheme, parsed.netloc),
+									   lambda: "%s://%s" % (parsed.scheme, parsed.hostname))
 
 	
 	
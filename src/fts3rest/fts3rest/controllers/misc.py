@@ -1,7 +1,9 @@
 from fts3rest.lib.base import BaseController, Session
 from fts3rest.lib.helpers import jsonify
+from fts3rest.lib.middleware.fts3auth import authorize
+from fts3rest.lib.middleware.fts3auth.constants import *
 from fts3.model import CredentialVersion, SchemaVersion
-from pylons import request
+from pylons import app_globals, request
 
 
 class _Version:
@@ -26,6 +28,14 @@ class MiscController(BaseController):
 					'fts:whoami': {'href': '/whoami', 'title': 'Check user certificate'},
 					
 					'fts:joblist': {'href': '/jobs{?vo_name,user_dn}', 'title': 'List of active jobs', 'templated': True},
+					'fts:jobcancelmany': {
+						'href': '/jobs{?vo_name,user_dn,source_se,dest_se}',
+						'title': 'Cancel all the active jobs matching the filter',
+						'templated': True,
+						'hints': {
+							'allow': ['DELETE']
+						}
+					},
 					'fts:job': {
 						'href': '/jobs/{id}',
 						'title': 'Job information',
@@ -37,6 +47,36 @@ class MiscController(BaseController):
 					
 					
 					'fts:configaudit': {'href': '/config/audit', 'title': 'Configuration'},
+					'fts:monitoring': {'href': '/monitoring', 'title': 'Internal caches and queues'},
+					'fts:summary': {
+						'href': '/summary{?vo_name,source_se,dest_se,states}',
+						'title': 'Number of jobs and files per state, VO and storage pair',
+						'templated': True
+					},
+					'fts:queue': {
+						'href': '/summary/queue{?vo_name,source_se,dest_se,states}',
+						'title': 'Active files per state, VO and storage pair',
+						'templated': True
+					},
+					'fts:jobfiles': {
+						'href': '/jobs/{id}/files{?file_state,fields,limit,after}',
+						'title': 'Files of a job',
+						'templated': True
+					},
+					'fts:jobstatus': {
+						'href': '/jobs/status{?ids,files}',
+						'title': 'Status of several jobs',
+						'templated': True,
+						'hints': {
+							'allow': ['GET', 'POST'],
+							'accept-post': 'application/json'
+						}
+					},
+					'fts:jobevents': {
+						'href': '/jobs/events{?vo_name,user_dn,source_se,dest_se}',
+						'title': 'Stream of state changes (server-sent events)',
+						'templated': True
+					},
 					
 					'fts:submitschema': {'href': '/schema/submit', 'title': 'JSON schema of messages'},
 					'fts:jobsubmit': {
@@ -46,9 +86,37 @@ class MiscController(BaseController):
 							'representations': ['fts:submitschema']
 						}
 					},
+					'fts:jobsubmitstream': {
+						'href': '/jobs/stream',
+						'title': 'Submit a job with a large number of transfers',
+						'hints': {
+							'allow': ['POST'],
+							'representations': ['fts:submitschema']
+						}
+					},
+					'fts:jobsubmitbulk': {
+						'href': '/jobs/bulk',
+						'title': 'Submit a list of jobs',
+						'hints': {
+							'allow': ['POST']
+						}
+					},
 				}
 			}
 
 	@jsonify
 	def whoami(self):
 		return request.environ['fts3.User.Credentials']
+
+
+	@authorize(CONFIG)
+	@jsonify
+	def monitoring(self, **kwargs):
+		return {'se_cache':    app_globals.seCache.stats(),
+				'banned_dns':  app_globals.bannedDNs.stats(),
+				'banned_ses':  app_globals.bannedSEs.stats(),
+				'credentials': app_globals.credentialCache.stats(),
+				'summary':     app_globals.summaryCache.stats(),
+				'job_writer':  app_globals.jobWriter.stats(),
+				'job_watcher': app_globals.jobWatcher.stats(),
+				'change_feed': app_globals.changeFeed.stats()}
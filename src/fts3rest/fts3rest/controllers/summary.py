@@ -0,0 +1,95 @@
+from fts3.model import Job, File, JobActiveStates, FileActiveStates, QueueCounter
+from fts3rest.lib.base import BaseController, Session
+from fts3rest.lib.helpers import jsonify
+from fts3rest.lib.middleware.fts3auth import authorize
+from fts3rest.lib.middleware.fts3auth.constants import *
+from pylons import app_globals, request
+from pylons.controllers.util import abort
+from sqlalchemy import func
+
+
+class SummaryController(BaseController):
+	
+	def _getStates(self, default):
+		if request.params.get('states', None):
+			return sorted(set(request.params['states'].split(',')))
+		return default
+	
+	def _getScope(self, voName):
+		"""
+		Returns (vos, dn), what the user can see depending on the granted level.
+		None means no restriction.
+		"""
+		user  = request.environ['fts3.User.Credentials']
+		level = user.getGrantedLevelFor(TRANSFER)
+		if level == VO:
+			if voName and not user.hasVo(voName):
+				abort(403, 'Not enough permissions to see the jobs of "%s"' % voName)
+			return (tuple(sorted(user.vos)), None)
+		elif level == PRIVATE:
+			return (None, user.user_dn)
+		return (None, None)
+	
+	def _count(self, query, vo, source, dest, state, filters, scope):
+		"""Adds the filters and the scope, and groups by (vo, source, destination, state)"""
+		for (column, value) in zip((vo, source, dest), filters):
+			if value:
+				query = query.filter(column == value)
+		(vos, dn) = scope
+		if vos is not None:
+			query = query.filter(vo.in_(vos))
+		if dn is not None:
+			query = query.filter(Job.user_dn == dn)
+		return query.group_by(vo, source, dest, state).all()
+	
+	@authorize(TRANSFER)
+	@jsonify
+	def index(self, **kwargs):
+		"""GET /summary: Number of jobs and files per state, VO and storage pair"""
+		filters    = [request.params.get(k, None) for k in ('vo_name', 'source_se', 'dest_se')]
+		jobStates  = self._getStates(JobActiveStates)
+		fileStates = self._getStates(FileActiveStates)
+		scope      = self._getScope(filters[0])
+		
+		# Dashboards poll this, so it is served from memory for a few seconds
+		key = tuple(filters) + (tuple(jobStates), tuple(fileStates), scope)
+		summary = app_globals.summaryCache.get(key)
+		if summary is not None:
+			return summary
+		
+		jobs = Session.query(Job.vo_name, Job.source_se, Job.dest_se, Job.job_state, func.count(Job.job_id))\
+			.filter(Job.job_state.in_(jobStates))
+		jobs = self._count(jobs, Job.vo_name, Job.source_se, Job.dest_se, Job.job_state, filters, scope)
+		
+		files = Session.query(Job.vo_name, File.source_se, File.dest_se, File.file_state, func.count(File.file_id))\
+			.filter(File.job_id == Job.job_id).filter(File.file_state.in_(fileStates))
+		files = self._count(files, Job.vo_name, File.source_se, File.dest_se, File.file_state, filters, scope)
+		
+		groups = {}
+		for (kind, rows) in (('jobs', jobs), ('files', files)):
+			for (vo, source, dest, state, count) in rows:
+				group = groups.setdefault((vo, source, dest), {'vo_name': vo, 'source_se': source, 'dest_se': dest,
+															   'jobs': {}, 'files': {}})
+				group[kind][state] = count
+		
+		summary = sorted(groups.values(), key = lambda g: (g['vo_name'], g['source_se'], g['dest_se']))
+		app_globals.summaryCache.put(key, summary)
+		return summary
+	
+	@authorize(TRANSFER)
+	@jsonify
+	def queue(self, **kwargs):
+		"""GET /summary/queue: Number of active files per state, VO and storage pair, from the counters"""
+		(vos, dn) = self._getScope(request.params.get('vo_name', None))
+		if dn is not None:
+			abort(403, 'The counters are kept per VO, not per user, use /summary instead')
+		
+		counters = Session.query(QueueCounter).filter(QueueCounter.count > 0)
+		if vos is not None:
+			counters = counters.filter(QueueCounter.vo_name.in_(vos))
+		for key in ('vo_name', 'source_se', 'dest_se'):
+			if request.params.get(key, None):
+				counters = counters.filter(getattr(QueueCounter, key) == request.params[key])
+		if request.params.get('states', None):
+			counters = counters.filter(QueueCounter.file_state.in_(request.params['states'].split(',')))
+		return counters.all()
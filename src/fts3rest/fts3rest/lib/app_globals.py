@@ -2,6 +2,14 @@
 
 from beaker.cache import CacheManager
 from beaker.util import parse_cache_config_options
+from paste.deploy.converters import asint
+
+from fts3.model import BannedDN, BannedSE
+from fts3rest.lib.banned import BannedSnapshot
+from fts3rest.lib.cache import LRUCache, TTLCache
+from fts3rest.lib.feed import ChangeFeed
+from fts3rest.lib.watcher import JobWatcher
+from fts3rest.lib.writer import JobWriter
 
 class Globals(object):
     """Globals acts as a container for objects available throughout the
@@ -16,3 +24,35 @@ class Globals(object):
 
         """
         self.cache = CacheManager(**parse_cache_config_options(config))
+
+        # Storage element of each scheme://host:port prefix
+        self.seCache = LRUCache(asint(config.get('fts3.SECacheSize', 1000)))
+
+        # Banned users and storages
+        refresh = asint(config.get('fts3.BannedRefreshInterval', 300))
+        check   = asint(config.get('fts3.BannedCheckInterval', 10))
+        self.bannedDNs = BannedSnapshot(BannedDN.dn, refresh, check)
+        self.bannedSEs = BannedSnapshot(BannedSE.se, refresh, check)
+
+        # Termination time of the delegated credentials, per (dlg_id, dn)
+        self.credentialCache = TTLCache(asint(config.get('fts3.CredentialCacheTTL', 60)))
+
+        # Results of /summary
+        self.summaryCache = TTLCache(asint(config.get('fts3.SummaryCacheTTL', 5)), 1000)
+
+        # Whether t_idempotency_key exists, checked on the first submission with a key
+        self.idempotencyEnabled = None
+
+        # Writer of the jobs accepted in asynchronous mode
+        self.jobWriter = JobWriter(asint(config.get('fts3.AsyncQueueSize', 1000)),
+                                   asint(config.get('fts3.AsyncBatchSize', 100)),
+                                   asint(config.get('fts3.AsyncFailedJobs', 1000)))
+
+        # Poller of the jobs clients are waiting on
+        self.jobWatcher = JobWatcher(asint(config.get('fts3.WatchInterval', 2)),
+                                     maxWaiters = asint(config.get('fts3.MaxWaiters', 20)))
+
+        # Detector of state changes, for the event streams
+        self.changeFeed = ChangeFeed(asint(config.get('fts3.EventInterval', 5)),
+                                     asint(config.get('fts3.EventHistory', 10000)),
+                                     idle = asint(config.get('fts3.EventIdleTimeout', 60)))
@@ -0,0 +1,67 @@
+from fts3rest.lib.base import Session
+from sqlalchemy import func
+import threading
+import time
+
+
+class BannedSnapshot(object):
+	"""
+	In memory copy of one of the banned tables (t_bad_dns, t_bad_ses), so
+	checking if something is banned is a set lookup.
+	Every checkInterval seconds the number of entries and the latest addition
+	time are queried, and the whole set is reloaded if any of them moved.
+	It is reloaded anyway every refreshInterval seconds.
+	"""
+
+	def __init__(self, column, refreshInterval = 300, checkInterval = 10):
+		self.column          = column
+		self.refreshInterval = refreshInterval
+		self.checkInterval   = checkInterval
+		self.banned          = frozenset()
+		self.lastRefresh     = 0
+		self.lastCheck       = 0
+		self._fingerprint    = None
+		self._lock           = threading.Lock()
+
+
+	def _load(self, session, force):
+		now = time.time()
+		fingerprint = tuple(session.query(func.count(self.column),
+										  func.max(self.column.class_.addition_time)).one())
+		if force or fingerprint != self._fingerprint or now - self.lastRefresh >= self.refreshInterval:
+			self.banned       = frozenset([row[0] for row in session.query(self.column)])
+			self.lastRefresh  = now
+			self._fingerprint = fingerprint
+		self.lastCheck = now
+
+
+	def refresh(self, force = False):
+		"""
+		Reloads the snapshot if it is due. If another thread is already
+		reloading, the current one is used meanwhile, unless it has never been loaded.
+		"""
+		if not force and time.time() - self.lastCheck < self.checkInterval:
+			return
+		if not self._lock.acquire(self.lastRefresh == 0 or force):
+			return
+		try:
+			# Own session, so the transaction of the caller is left alone
+			session = Session.session_factory()
+			try:
+				self._load(session, force)
+			finally:
+				session.close()
+		finally:
+			self._lock.release()
+
+
+	def __contains__(self, key):
+		self.refresh()
+		return key in self.banned
+
+
+	def stats(self):
+		return {'entries':      len(self.banned),
+				'age':          time.time() - self.lastRefresh,
+				'refresh':      self.refreshInterval,
+				'check':        self.checkInterval}
@@ -0,0 +1,72 @@
+from sqlalchemy.orm import class_mapper, ColumnProperty
+from sqlalchemy import Integer
+from fts3.model import Job, File, IdempotencyKey
+from fts3rest.lib.counters import adjustCounters, countJobs
+
+
+# Number of rows sent per executemany
+CHUNK_SIZE = 1000
+
+# Cache of (attribute, column key) pairs per mapped class
+_columnMaps = {}
+
+
+def _columnMap(klass):
+	"""
+	Returns the list of (attribute, column key) pairs for the mapped class.
+	Integer primary keys are left out, so the database assigns them.
+	"""
+	if klass not in _columnMaps:
+		columns = []
+		for prop in class_mapper(klass).iterate_properties:
+			if isinstance(prop, ColumnProperty):
+				column = prop.columns[0]
+				if column.primary_key and isinstance(column.type, Integer):
+					continue
+				columns.append((prop.key, column.key))
+		_columnMaps[klass] = columns
+	return _columnMaps[klass]
+
+
+
+def rowFromObject(obj):
+	"""
+	Returns a dictionary suitable for a core insert built from the
+	mapped object obj
+	"""
+	return dict([(key, getattr(obj, attr)) for (attr, key) in _columnMap(type(obj))])
+
+
+
+def insertRows(session, table, rows, chunkSize = CHUNK_SIZE):
+	"""
+	Inserts rows into table, sending them in batches of chunkSize
+	"""
+	insert = table.insert()
+	for i in xrange(0, len(rows), chunkSize):
+		session.execute(insert, rows[i:i + chunkSize])
+
+
+
+def insertJobs(session, jobs, chunkSize = CHUNK_SIZE):
+	"""
+	Inserts the new jobs and their files without going through the
+	identity map, together with the idempotency keys they were submitted
+	with, if any, and updates the queue counters. It does not commit.
+	"""
+	jobRows  = []
+	fileRows = []
+	keyRows  = []
+	for job in jobs:
+		jobRows.append(rowFromObject(job))
+		for file in job.files:
+			row = rowFromObject(file)
+			row['job_id'] = job.job_id
+			fileRows.append(row)
+		if getattr(job, '_idempotency', None) is not None:
+			keyRows.append(rowFromObject(job._idempotency))
+
+	insertRows(session, Job.__table__, jobRows, chunkSize)
+	insertRows(session, File.__table__, fileRows, chunkSize)
+	insertRows(session, IdempotencyKey.__table__, keyRows, chunkSize)
+	adjustCounters(session, countJobs(jobs))
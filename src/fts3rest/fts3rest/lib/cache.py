@@ -0,0 +1,170 @@
+import collections
+import threading
+import time
+
+
+class _OrderedEntries(object):
+	"""
+	Entries kept in the order they were last set, since
+	collections.OrderedDict is not available in Python 2.6.
+	Each set appends to a queue; the stale positions left behind are
+	skipped when popping, and purged once they outnumber the entries.
+	"""
+
+	def __init__(self):
+		self._values = {}
+		self._order  = collections.deque()
+		self._tick   = 0
+
+
+	def __len__(self):
+		return len(self._values)
+
+
+	def __contains__(self, key):
+		return key in self._values
+
+
+	def get(self, key, default = None):
+		if key in self._values:
+			return self._values[key][1]
+		return default
+
+
+	def set(self, key, value):
+		"""Sets the value, which becomes the newest entry"""
+		self._tick += 1
+		self._values[key] = (self._tick, value)
+		self._order.append((self._tick, key))
+		if len(self._order) > 2 * len(self._values) + 16:
+			self._order = collections.deque(sorted([(t, k) for (k, (t, v)) in self._values.iteritems()]))
+
+
+	def pop(self, key, default = None):
+		if key in self._values:
+			return self._values.pop(key)[1]
+		return default
+
+
+	def popOldest(self):
+		while self._order:
+			(tick, key) = self._order.popleft()
+			entry = self._values.get(key, None)
+			if entry is not None and entry[0] == tick:
+				del self._values[key]
+				return
+
+
+	def clear(self):
+		self._values.clear()
+		self._order.clear()
+
+
+
+
+class LRUCache(object):
+	"""
+	Size bounded cache that drops the least recently used entries first.
+	It is safe to share between threads.
+	"""
+
+	def __init__(self, size):
+		self.size     = size
+		self.hits     = 0
+		self.misses   = 0
+		self._entries = _OrderedEntries()
+		self._lock    = threading.Lock()
+
+
+	def get(self, key, create):
+		"""Returns the value stored for key, calling create() to build it on a miss"""
+		with self._lock:
+			if key in self._entries:
+				value = self._entries.get(key)
+				self._entries.set(key, value)
+				self.hits += 1
+				return value
+			self.misses += 1
+
+		value = create()
+
+		with self._lock:
+			self._entries.set(key, value)
+			while len(self._entries) > self.size:
+				self._entries.popOldest()
+		return value
+
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+	def stats(self):
+		return {'entries':  len(self._entries),
+				'capacity': self.size,
+				'hits':     self.hits,
+				'misses':   self.misses}
+
+
+
+class TTLCache(object):
+	"""
+	Cache whose entries expire ttl seconds after being stored.
+	At most size entries are kept. It is safe to share between threads.
+	"""
+
+	def __init__(self, ttl, size = 10000):
+		self.ttl      = ttl
+		self.size     = size
+		self.hits     = 0
+		self.misses   = 0
+		self._entries = _OrderedEntries()
+		self._lock    = threading.Lock()
+
+
+	def get(self, key):
+		"""Returns the value stored for key, or None if missing or expired"""
+		now = time.time()
+		with self._lock:
+			entry = self._entries.get(key, None)
+			if entry is not None and entry[0] > now:
+				self.hits += 1
+				return entry[1]
+			if entry is not None:
+				self._entries.pop(key)
+			self.misses += 1
+			return None
+
+
+	def put(self, key, value):
+		if self.ttl <= 0:
+			return
+		with self._lock:
+			self._entries.set(key, (time.time() + self.ttl, value))
+			# Oldest entries go first, so they are the first to expire too
+			while len(self._entries) > self.size:
+				self._entries.popOldest()
+
+
+	def invalidate(self, key):
+		with self._lock:
+			self._entries.pop(key, None)
+
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		hitRate = None
+		if lookups:
+			hitRate = float(self.hits) / lookups
+		return {'entries':  len(self._entries),
+				'capacity': self.size,
+				'ttl':      self.ttl,
+				'hits':     self.hits,
+				'misses':   self.misses,
+				'hit_rate': hitRate}
@@ -0,0 +1,40 @@
+from datetime import datetime
+from fts3.model import Job, File, JobActiveStates, FileActiveStates
+from fts3rest.lib.counters import adjustCounters
+from sqlalchemy import and_, func, select
+
+
+def cancelJobs(session, jobIds, reason, now = None):
+	"""
+	Cancels the jobs in jobIds that are still active, and their active files,
+	with one UPDATE for the files and one for the jobs, whatever their number.
+	The files are canceled first, and only those of the jobs still active,
+	so they are the same the counters are decreased for.
+	Returns (number of jobs canceled, number of files canceled).
+	It does not commit.
+	"""
+	if now is None:
+		now = datetime.now()
+
+	active = and_(Job.job_id.in_(jobIds), Job.job_state.in_(JobActiveStates))
+
+	counts = session.query(Job.vo_name, File.source_se, File.dest_se, File.file_state, func.count(File.file_id))\
+		.filter(File.job_id == Job.job_id).filter(active)\
+		.filter(File.file_state.in_(FileActiveStates))\
+		.group_by(Job.vo_name, File.source_se, File.dest_se, File.file_state)
+	deltas = {}
+	for (vo, source, dest, state, count) in counts:
+		deltas[(source, dest, vo, state)] = -count
+
+	files = session.execute(File.__table__.update()
+		.where(and_(File.job_id.in_(select([Job.job_id]).where(active)), File.file_state.in_(FileActiveStates)))
+		.values(file_state = 'CANCELED', finish_time = now, job_finished = now, reason = reason))
+
+	jobs = session.execute(Job.__table__.update().where(active)
+		.values(job_state = 'CANCELED', finish_time = now, job_finished = now, reason = reason))
+	if not jobs.rowcount:
+		return (0, 0)
+
+	adjustCounters(session, deltas)
+
+	return (jobs.rowcount, files.rowcount)
@@ -0,0 +1,75 @@
+from fts3.model import Job, File, FileActiveStates, QueueCounter
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+
+_counters = QueueCounter.__table__
+
+
+def countFile(deltas, file, voName, delta = 1):
+	"""Accounts for file in deltas, a dictionary (source, destination, vo, state) => delta"""
+	if file.file_state in FileActiveStates:
+		key = (file.source_se, file.dest_se, voName, file.file_state)
+		deltas[key] = deltas.get(key, 0) + delta
+
+
+
+def countJobs(jobs):
+	"""Returns the deltas that the submission of jobs cause"""
+	deltas = {}
+	for job in jobs:
+		for file in job.files:
+			countFile(deltas, file, job.vo_name)
+	return deltas
+
+
+
+def _matches(key):
+	(source, dest, vo, state) = key
+	return and_(_counters.c.source_se == source, _counters.c.dest_se == dest,
+				_counters.c.vo_name == vo, _counters.c.file_state == state)
+
+
+
+def adjustCounters(session, deltas):
+	"""
+	Applies deltas to the counters within the current transaction, so they
+	are committed, or rolled back, together with the change they count
+	"""
+	# Always in the same order, so concurrent transactions do not deadlock
+	for key in sorted(deltas.iterkeys()):
+		delta = deltas[key]
+		if delta == 0:
+			continue
+		update = _counters.update().where(_matches(key)).values(count = _counters.c.count + delta)
+		if session.execute(update).rowcount:
+			continue
+		(source, dest, vo, state) = key
+		# Someone else may be creating the same counter. A duplicate key only
+		# rolls back the failed statement, not the whole transaction
+		try:
+			session.execute(_counters.insert().values(source_se = source, dest_se = dest, vo_name = vo,
+													  file_state = state, count = delta))
+		except IntegrityError:
+			session.execute(update)
+
+
+
+def repairCounters(session):
+	"""
+	Recomputes all the counters from t_file, and commits.
+	Returns the number of counters written.
+	"""
+	counts = session.query(File.source_se, File.dest_se, Job.vo_name, File.file_state, func.count(File.file_id))\
+		.filter(File.job_id == Job.job_id).filter(File.file_state.in_(FileActiveStates))\
+		.group_by(File.source_se, File.dest_se, Job.vo_name, File.file_state).all()
+	try:
+		session.execute(_counters.delete())
+		if counts:
+			session.execute(_counters.insert(), [{'source_se': source, 'dest_se': dest, 'vo_name': vo,
+												  'file_state': state, 'count': count}
+												 for (source, dest, vo, state, count) in counts])
+		session.commit()
+	except:
+		session.rollback()
+		raise
+	return len(counts)
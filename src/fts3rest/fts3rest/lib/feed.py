@@ -0,0 +1,288 @@
+from datetime import datetime
+from fts3.model import Job, File, JobActiveStates, FileActiveStates
+from fts3rest.lib.base import Session
+from sqlalchemy import and_, or_
+import atexit
+import collections
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+
+class ChangeEvent(object):
+	"""A job or a file that changed state"""
+
+	def __init__(self, seq, type, row, previousState):
+		self.seq            = seq
+		self.type           = type
+		self.job_id         = row.job_id
+		self.file_id        = getattr(row, 'file_id', None)
+		self.state          = row.state
+		self.previous_state = previousState
+		self.vo_name        = row.vo_name
+		self.user_dn        = row.user_dn
+		self.source_se      = row.source_se
+		self.dest_se        = row.dest_se
+		self.timestamp      = datetime.utcnow()
+
+
+
+class ChangeFeed(object):
+	"""
+	Detects the state changes of jobs and files. A single background thread
+	compares, every interval seconds, the states of the active jobs and files
+	with the ones seen on the previous pass. The changes are kept in a
+	bounded history, which all the listeners read from, so the cost in queries
+	does not depend on the number of listeners.
+	Each listener gives its scope, a dictionary column => allowed values
+	(vo_name, user_dn, source_se or dest_se), and only the jobs and files
+	within the scope of some listener are looked at. Only a listener without
+	scope makes the thread look at all of them. Jobs and files entering the
+	scope when a listener arrives are taken as they are, without an event.
+	Event ids are '<epoch>.<sequence>'. The epoch is unique to this process,
+	so listeners can resume after a reconnection only if they reach the same
+	process, and the events are still in the history. Otherwise, the stream
+	starts from the current events.
+	Once nobody has listened for idle seconds, the thread stops and the
+	states and the history are dropped. The next listener starts it again,
+	with a new epoch.
+	"""
+
+	def __init__(self, interval = 5, history = 10000, chunkSize = 500, idle = 60):
+		self.interval   = interval
+		self.chunkSize  = chunkSize
+		self.idle       = idle
+		self.events     = collections.deque(maxlen = history)
+		self.epoch      = uuid.uuid4().hex
+		self.seq        = 0
+		self.passes     = 0
+		self.listeners  = 0
+		self._jobs      = None
+		self._files     = None
+		self._scopes    = {}
+		self._scoped    = None
+		self._idleSince = None
+		self._cond      = threading.Condition()
+		self._thread    = None
+		self._running   = False
+		atexit.register(self.stop)
+
+
+	def _start(self):
+		with self._cond:
+			if self._thread is None or not self._thread.isAlive():
+				self._running = True
+				self._idleSince = None
+				self._thread = threading.Thread(target = self._run, name = 'ChangeFeed')
+				self._thread.daemon = True
+				self._thread.start()
+
+
+	def stop(self):
+		self._running = False
+
+
+	def eventId(self, event):
+		return '%s.%d' % (self.epoch, event.seq)
+
+
+	def _resumeFrom(self, lastEventId):
+		"""Returns the sequence number from where a listener must start"""
+		if lastEventId:
+			try:
+				(epoch, seq) = lastEventId.split('.')
+				if epoch == self.epoch:
+					return min(int(seq), self.seq)
+			except ValueError:
+				pass
+		return self.seq
+
+
+	def _scopeKey(self, scope):
+		if scope is None:
+			return None
+		return tuple(sorted([(column, tuple(sorted(values))) for (column, values) in scope.iteritems()]))
+
+
+	def listen(self, match, lastEventId = None, keepAlive = 15, duration = None, scope = None):
+		"""
+		Generates the events for which match returns True, starting after
+		lastEventId, if still known. None is generated when there has been no
+		event for keepAlive seconds. It ends after duration seconds.
+		scope, if given, limits what is looked at for this listener, and must
+		cover whatever match accepts.
+		"""
+		scopeKey = self._scopeKey(scope)
+		with self._cond:
+			# Started within the lock, so the thread can not be stopping meanwhile
+			self._start()
+			seq = self._resumeFrom(lastEventId)
+			self.listeners += 1
+			self._scopes[scopeKey] = self._scopes.get(scopeKey, 0) + 1
+		deadline = None
+		if duration:
+			deadline = time.time() + duration
+
+		try:
+			while deadline is None or time.time() < deadline:
+				timeout = keepAlive
+				if deadline is not None:
+					timeout = max(0, min(keepAlive, deadline - time.time()))
+				with self._cond:
+					if self.seq == seq:
+						self._cond.wait(timeout)
+					events = []
+					if self.events and self.seq > seq:
+						first = max(0, seq + 1 - self.events[0].seq)
+						events = list(itertools.islice(self.events, first, None))
+					seq = self.seq
+
+				matching = filter(match, events)
+				if not matching:
+					yield None
+				for event in matching:
+					yield event
+		finally:
+			with self._cond:
+				self.listeners -= 1
+				self._scopes[scopeKey] -= 1
+				if not self._scopes[scopeKey]:
+					del self._scopes[scopeKey]
+
+
+	def _notify(self, type, rows, previous, onlyKnown = False):
+		"""
+		Records the changes of rows compared to previous, a dictionary key => state.
+		If onlyKnown, the rows not in previous are not a change.
+		"""
+		with self._cond:
+			for (key, row) in rows:
+				if onlyKnown and key not in previous:
+					continue
+				previousState = previous.get(key, None)
+				if previousState != row.state:
+					self.seq += 1
+					self.events.append(ChangeEvent(self.seq, type, row, previousState))
+			self._cond.notifyAll()
+
+
+	def _queryChunked(self, query, column, keys):
+		rows = []
+		for i in xrange(0, len(keys), self.chunkSize):
+			rows.extend(query.filter(column.in_(keys[i:i + self.chunkSize])).all())
+		return rows
+
+
+	def _jobQuery(self, session):
+		return session.query(Job.job_id, Job.job_state.label('state'), Job.vo_name, Job.user_dn,
+							 Job.source_se, Job.dest_se)
+
+
+	def _fileQuery(self, session):
+		return session.query(File.file_id, File.job_id, File.file_state.label('state'),
+							 Job.vo_name, Job.user_dn, File.source_se, File.dest_se)\
+					  .filter(File.job_id == Job.job_id)
+
+
+	def _scopeFilter(self, scopes, columns):
+		"""
+		Returns the condition matching any of the scopes, with columns a
+		dictionary name => column, or None if there is no restriction
+		"""
+		if not scopes or None in scopes:
+			return None
+		conditions = []
+		for scope in scopes:
+			conditions.append(and_(*[columns[column].in_(values) for (column, values) in scope]))
+		return or_(*conditions)
+
+
+	def _pass(self, session):
+		with self._cond:
+			scopes = sorted(self._scopes.iterkeys())
+
+		jobQuery = self._jobQuery(session).filter(Job.job_state.in_(JobActiveStates))
+		jobScope = self._scopeFilter(scopes, {'vo_name': Job.vo_name, 'user_dn': Job.user_dn,
+											  'source_se': Job.source_se, 'dest_se': Job.dest_se})
+		if jobScope is not None:
+			jobQuery = jobQuery.filter(jobScope)
+		fileQuery = self._fileQuery(session).filter(File.file_state.in_(FileActiveStates))
+		fileScope = self._scopeFilter(scopes, {'vo_name': Job.vo_name, 'user_dn': Job.user_dn,
+											   'source_se': File.source_se, 'dest_se': File.dest_se})
+		if fileScope is not None:
+			fileQuery = fileQuery.filter(fileScope)
+
+		jobs  = dict([(r.job_id, r) for r in jobQuery])
+		files = dict([(r.file_id, r) for r in fileQuery])
+
+		if self._jobs is not None:
+			# What enters the scope was not seen before, so it is not a change
+			onlyKnown = (scopes != self._scoped)
+
+			# Those not active, or not in the scope, anymore
+			gone = [k for k in self._jobs.iterkeys() if k not in jobs]
+			finished = self._queryChunked(self._jobQuery(session), Job.job_id, gone)
+			self._notify('job', itertools.chain(jobs.iteritems(), [(r.job_id, r) for r in finished]),
+						 self._jobs, onlyKnown)
+
+			gone = [k for k in self._files.iterkeys() if k not in files]
+			finished = self._queryChunked(self._fileQuery(session), File.file_id, gone)
+			self._notify('file', itertools.chain(files.iteritems(), [(r.file_id, r) for r in finished]),
+						 self._files, onlyKnown)
+
+		self._jobs   = dict([(k, r.state) for (k, r) in jobs.iteritems()])
+		self._files  = dict([(k, r.state) for (k, r) in files.iteritems()])
+		self._scoped = scopes
+		self.passes += 1
+
+
+	def _isIdle(self):
+		"""
+		Returns True, and forgets everything, if nobody has listened for
+		idle seconds. The thread must then stop.
+		"""
+		with self._cond:
+			if self.listeners:
+				self._idleSince = None
+				return False
+			if self._idleSince is None:
+				self._idleSince = time.time()
+			if time.time() - self._idleSince < self.idle:
+				return False
+			self._thread = None
+			self._jobs   = None
+			self._files  = None
+			self._scoped = None
+			self.events.clear()
+			self.epoch   = uuid.uuid4().hex
+			return True
+
+
+	def _run(self):
+		while self._running:
+			if self._isIdle():
+				break
+			session = Session.session_factory()
+			try:
+				self._pass(session)
+			except Exception:
+				log.exception('Failed to look for state changes')
+			finally:
+				session.close()
+			time.sleep(self.interval)
+
+
+	def stats(self):
+		with self._cond:
+			return {'running':   self._thread is not None,
+					'listeners': self.listeners,
+					'scopes':    len(self._scopes),
+					'passes':    self.passes,
+					'events':    self.seq,
+					'history':   len(self.events),
+					'jobs':      len(self._jobs or []),
+					'files':     len(self._files or [])}
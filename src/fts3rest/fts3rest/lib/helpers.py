@@ -2,40 +2,142 @@ from ConfigParser import SafeConfigParser
 from datetime import datetime
 from decorator import decorator
 from fts3.model.base import Base
+from fts3rest.model.meta import Session
 from pylons.decorators.util import get_pylons
+from sqlalchemy import DateTime
+from sqlalchemy.orm import class_mapper, ColumnProperty, Query
 from StringIO import StringIO
 from webob.exc import HTTPException
 from webob import Response
 import json
 import os
+import types
+
+
+# Rows fetched per round trip when streaming a query
+STREAM_CHUNK_SIZE = 100
+
+
+def _formatDatetime(value):
+	if value.tzinfo is not None:
+		return value.strftime('%Y-%m-%dT%H:%M:%S%z')
+	# isoformat is much cheaper than strftime, and gives the same without microseconds
+	if value.microsecond:
+		value = value.replace(microsecond = 0)
+	return value.isoformat()
+
+
+
+class _ClassEncoding(object):
+	"""
+	Precompiled serialization of a mapped class: which attributes are columns,
+	and the converters their values need
+	"""
+
+	def __init__(self, klass):
+		self.columns    = set()
+		self.converters = {}
+		for prop in class_mapper(klass).iterate_properties:
+			if isinstance(prop, ColumnProperty):
+				self.columns.add(prop.key)
+				if isinstance(prop.columns[0].type, DateTime):
+					self.converters[prop.key] = _formatDatetime
+
+
+	def encode(self, obj, visited):
+		"""
+		Only what is loaded is serialized, so nothing is lazily loaded.
+		Relations and attributes other than columns go through the generic path.
+		"""
+		values     = {}
+		columns    = self.columns
+		converters = self.converters
+		for (k, v) in obj.__dict__.iteritems():
+			if k in columns:
+				if v is not None and k in converters:
+					v = converters[k](v)
+				values[k] = v
+			elif not k.startswith('_'):
+				if isinstance(v, Base):
+					if id(v) in visited:
+						continue
+					visited.add(id(v))
+				values[k] = v
+		return values
+
+
+_classEncodings = {}
 
 
 class ClassEncoder(json.JSONEncoder):
 	
 	def __init__(self, *args, **kwargs):
 		super(ClassEncoder, self).__init__(*args, **kwargs)
-		self.visited = []
+		# Identities of the objects already serialized, to break cycles
+		self.visited = set()
 
 
 	def default(self, obj):
-		if isinstance(obj, Base):
-			self.visited.append(obj)
-				
 		if isinstance(obj, datetime):
-			return obj.strftime('%Y-%m-%dT%H:%M:%S%z')
-		elif isinstance(obj, Base) or isinstance(obj, object):			
+			return _formatDatetime(obj)
+		elif isinstance(obj, Base):
+			self.visited.add(id(obj))
+			klass = type(obj)
+			encoding = _classEncodings.get(klass, None)
+			if encoding is None:
+				encoding = _classEncodings[klass] = _ClassEncoding(klass)
+			return encoding.encode(obj, self.visited)
+		elif isinstance(obj, object):
 			values = {}
 			for (k, v) in obj.__dict__.iteritems():
-				if not k.startswith('_') and v not in self.visited:
-					values[k] = v
+				if not k.startswith('_'):
 					if isinstance(v, Base):
-						self.visited.append(v)
-					
+						if id(v) in self.visited:
+							continue
+						self.visited.add(id(v))
+					values[k] = v
 			return values
 		else:
 			return super(ClassEncoder, self).default(obj)
 
 
+
+def iterQuery(query):
+	"""
+	Iterates the query with a session of its own, since the request scoped
+	one is removed before the response body is sent. Rows are fetched in
+	chunks from a server side cursor, and not kept by the session.
+	"""
+	session = Session.session_factory()
+	try:
+		query = query.with_session(session).execution_options(stream_results = True)
+		for obj in query.yield_per(STREAM_CHUNK_SIZE):
+			yield obj
+			if isinstance(obj, Base):
+				session.expunge(obj)
+	finally:
+		session.close()
+
+
+
+def streamJson(iterable):
+	"""
+	Generates a JSON list with the elements of iterable, one at a time, so
+	the whole collection is never held in memory
+	"""
+	yield '['
+	first = True
+	for obj in iterable:
+		if first:
+			yield '\n'
+			first = False
+		else:
+			yield ',\n'
+		yield json.dumps(obj, cls = ClassEncoder, indent = 2, sort_keys = True)
+	yield '\n]'
+
+
+
 @decorator
 def jsonify(f, *args, **kwargs):
 	pylons = get_pylons(args)
@@ -43,8 +145,16 @@ def jsonify(f, *args, **kwargs):
 	
 	try:
 		data = f(*args, **kwargs)
+		# Queries and generators are streamed
+		if isinstance(data, Query):
+			return streamJson(iterQuery(data))
+		elif isinstance(data, types.GeneratorType):
+			return streamJson(data)
 		return json.dumps(data, cls = ClassEncoder, indent = 2, sort_keys = True)
 	except HTTPException, e:
+		# Not modified has no body
+		if e.code == 304:
+			return e(kwargs['environ'], kwargs['start_response'])
 		jsonError = {'status': e.status, 'message': e.detail}
 		resp = Response(json.dumps(jsonError),
 						status = e.status,
@@ -0,0 +1,122 @@
+import json
+
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamError(ValueError):
+	pass
+
+
+
+class JSONObjectStream(object):
+	"""
+	Incrementally decodes a JSON object read from a file-like object.
+	Iterating yields (name, value) pairs for each member. Members listed in
+	arrays must be arrays, and are expanded yielding one (name, element)
+	pair per element, so they are never fully held in memory.
+	No single value can be bigger than maxValueSize, so a malformed one is
+	reported without reading the rest of the input.
+	"""
+
+	def __init__(self, fd, length = None, arrays = [], chunkSize = 65536, maxValueSize = 1048576):
+		self.fd           = fd
+		self.remaining    = length
+		self.arrays       = arrays
+		self.chunkSize    = chunkSize
+		self.maxValueSize = maxValueSize
+		self.decoder      = json.JSONDecoder()
+		self.buffer       = ''
+		self.pos          = 0
+		self.eof          = False
+
+
+	def _read(self):
+		"""Reads one more chunk into the buffer, dropping the consumed data"""
+		size = self.chunkSize
+		if self.remaining is not None:
+			size = min(size, self.remaining)
+
+		data = None
+		if size > 0:
+			data = self.fd.read(size)
+		if not data:
+			self.eof = True
+			return False
+
+		if self.remaining is not None:
+			self.remaining -= len(data)
+		self.buffer = self.buffer[self.pos:] + data
+		self.pos    = 0
+		return True
+
+
+	def _peek(self):
+		"""Skips whitespaces and returns the next character, None at the end"""
+		while True:
+			while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+				self.pos += 1
+			if self.pos < len(self.buffer):
+				return self.buffer[self.pos]
+			if not self._read():
+				return None
+
+
+	def _expect(self, chars):
+		c = self._peek()
+		if c is None or c not in chars:
+			raise JSONStreamError("Expected one of '%s', got '%s'" % (chars, c))
+		self.pos += 1
+		return c
+
+
+	def _value(self):
+		self._peek()
+		while True:
+			# raw_decode does not take a start index in Python 2.6
+			pending = self.buffer[self.pos:]
+			try:
+				(value, end) = self.decoder.raw_decode(pending)
+				# A number may have been cut at the end of the buffer
+				if end < len(pending) or self.eof:
+					self.pos += end
+					return value
+			except ValueError, e:
+				if self.eof or len(pending) > self.maxValueSize:
+					raise JSONStreamError(str(e))
+			if len(pending) > self.maxValueSize:
+				raise JSONStreamError('Value bigger than %d bytes' % self.maxValueSize)
+			self._read()
+
+
+	def _array(self):
+		self._expect('[')
+		if self._peek() == ']':
+			self.pos += 1
+			return
+		while True:
+			yield self._value()
+			if self._expect(',]') == ']':
+				return
+
+
+	def __iter__(self):
+		self._expect('{')
+		if self._peek() == '}':
+			self.pos += 1
+		else:
+			while True:
+				name = self._value()
+				if not isinstance(name, basestring):
+					raise JSONStreamError('Expected a member name')
+				self._expect(':')
+				if name in self.arrays:
+					for element in self._array():
+						yield (name, element)
+				else:
+					yield (name, self._value())
+				if self._expect(',}') == '}':
+					break
+
+		if self._peek() is not None:
+			raise JSONStreamError('Extra data after the object')
@@ -1,5 +1,3 @@
-from fts3rest.lib.base import Session
-from fts3.model import BannedDN
 from credentials import UserCredentials
 from webob.exc import HTTPForbidden
 
@@ -7,8 +5,9 @@ from webob.exc import HTTPForbidden
 class FTS3AuthMiddleware(object):
     
 	def __init__(self, wrap_app, config):
-		self.app    = wrap_app
-		self.config = config
+		self.app       = wrap_app
+		self.config    = config
+		self.bannedDNs = config['pylons.app_globals'].bannedDNs
 	
 	
 	def __call__(self, environ, start_response):
@@ -39,5 +38,4 @@ class FTS3AuthMiddleware(object):
 
 	
 	def _isBanned(self, credentials):
-		banned = Session.query(BannedDN).get(credentials.user_dn)
-		return banned is not None
+		return credentials.user_dn in self.bannedDNs
@@ -0,0 +1,208 @@
+from fts3.model import Job, File, IdempotencyKey, QueueCounter, SchemaVersion, JobActiveStates
+from fts3rest.lib.counters import repairCounters
+from sqlalchemy import text
+from sqlalchemy.engine import reflection
+
+
+def _index(klass, name):
+	for index in klass.__table__.indexes:
+		if index.name == name:
+			return index
+	raise KeyError(name)
+
+
+_ACTIVE = ', '.join(["'%s'" % s for s in JobActiveStates])
+
+
+class HotPath(object):
+	"""
+	An index, the REST endpoints it serves, and a query representative
+	of them, used to estimate how many rows they scan
+	"""
+
+	def __init__(self, index, endpoints, sample):
+		self.index     = index
+		self.endpoints = endpoints
+		self.sample    = sample
+
+
+
+class Migration(object):
+	"""
+	A set of tables and indexes that, once created, bring the schema to version.
+	If given, populate is called with a session once the tables are created.
+	"""
+
+	def __init__(self, version, description, paths, tables = [], populate = None):
+		self.version     = version
+		self.description = description
+		self.paths       = paths
+		self.tables      = tables
+		self.populate    = populate
+
+
+
+MIGRATIONS = [
+	Migration((1, 1, 0), 'Indexes for the REST interface access paths', [
+		HotPath(_index(Job, 'idx_job_state_vo'),
+				['GET /jobs?vo_name', 'GET /summary'],
+				"SELECT job_id FROM t_job WHERE job_state IN (%s) AND vo_name = 'dteam'" % _ACTIVE),
+		HotPath(_index(Job, 'idx_job_state_user'),
+				['GET /jobs?user_dn'],
+				"SELECT job_id FROM t_job WHERE job_state IN (%s) AND user_dn = '/DC=ch/DC=cern/CN=user'" % _ACTIVE),
+		HotPath(_index(Job, 'idx_job_state_submit_time'),
+				['GET /jobs?limit&after'],
+				"SELECT job_id FROM t_job WHERE job_state IN (%s) AND submit_time > '2013-01-01 00:00:00' "
+				"ORDER BY submit_time, job_id" % _ACTIVE),
+		HotPath(_index(File, 'idx_file_job_state'),
+				['GET /jobs/{id}', 'GET /jobs/{id}/files', 'DELETE /jobs/{id}'],
+				"SELECT file_id FROM t_file WHERE job_id = '00000000-0000-0000-0000-000000000000' AND file_state = 'FAILED'"),
+	]),
+	Migration((1, 2, 0), 'Queue depth counters', [], tables = [QueueCounter.__table__], populate = repairCounters),
+	Migration((1, 3, 0), 'Idempotency keys of the submissions', [
+		HotPath(_index(IdempotencyKey, 'idx_idempotency_expiration'),
+				['PUT /jobs (Idempotency-Key)'],
+				"SELECT idempotency_key FROM t_idempotency_key WHERE expiration <= '2013-01-01 00:00:00'"),
+	], tables = [IdempotencyKey.__table__])
+]
+
+
+
+def currentVersion(session):
+	"""Returns the schema version as a tuple, (0, 0, 0) if there is none"""
+	if SchemaVersion.__tablename__ not in existingTables(session.get_bind()):
+		return (0, 0, 0)
+	versions = [(v.major, v.minor, v.patch) for v in session.query(SchemaVersion)]
+	if not versions:
+		return (0, 0, 0)
+	return max(versions)
+
+
+
+def existingTables(engine):
+	"""Returns the names of the tables that exist in the database"""
+	inspector = reflection.Inspector.from_engine(engine)
+	return set([t.lower() for t in inspector.get_table_names()])
+
+
+
+def existingIndexes(engine, table):
+	"""Returns the names of the indexes that exist in the database for table"""
+	inspector = reflection.Inspector.from_engine(engine)
+	return set([i['name'].lower() for i in inspector.get_indexes(table.name)])
+
+
+
+def estimateRows(engine, sql):
+	"""
+	Returns (rows, plan), where rows is the number of rows the database
+	expects to scan to run sql (None if it does not tell), and plan a list
+	with the lines of the execution plan
+	"""
+	dialect = engine.dialect.name
+	if dialect == 'mysql':
+		result = engine.execute(text('EXPLAIN ' + sql))
+		plan = [dict(zip(result.keys(), row)) for row in result]
+		rows = sum([p['rows'] or 0 for p in plan])
+		return (rows, ['%s %s (key %s, rows %s)' % (p['select_type'], p['table'], p['key'], p['rows']) for p in plan])
+	elif dialect == 'oracle':
+		engine.execute(text("DELETE FROM plan_table WHERE statement_id = 'fts3rest'"))
+		engine.execute(text("EXPLAIN PLAN SET STATEMENT_ID = 'fts3rest' FOR " + sql))
+		plan = engine.execute(text(
+			"SELECT operation, options, object_name, cardinality FROM plan_table "
+			"WHERE statement_id = 'fts3rest' ORDER BY id")).fetchall()
+		engine.execute(text("DELETE FROM plan_table WHERE statement_id = 'fts3rest'"))
+		rows = sum([p[3] or 0 for p in plan if p[0] in ('TABLE ACCESS', 'INDEX')])
+		return (rows, ['%s %s %s (rows %s)' % tuple(p) for p in plan])
+	elif dialect == 'sqlite':
+		plan = engine.execute(text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+		return (None, [tuple(p)[-1] for p in plan])
+	else:
+		return (None, [])
+
+
+
+def verify(engine):
+	"""Returns the list of tables and indexes, of all the migrations, missing in the database"""
+	tables  = existingTables(engine)
+	missing = []
+	for migration in MIGRATIONS:
+		for table in migration.tables:
+			if table.name.lower() not in tables:
+				missing.append(table)
+		for path in migration.paths:
+			# The indexes of a missing table are missing too
+			if path.index.table.name.lower() not in tables or\
+			   path.index.name.lower() not in existingIndexes(engine, path.index.table):
+				missing.append(path.index)
+	return missing
+
+
+
+def migrate(engine, session, dryRun = False, logger = None):
+	"""
+	Creates the missing tables and indexes, and records the new schema version.
+	They are checked even for migrations older than the current version,
+	so a partially migrated database gets fixed.
+	Returns a report with one entry per table created and per index.
+	The indexes of tables that do not exist (yet) are reported as
+	'pending creation', without looking into them.
+	"""
+	version = currentVersion(session)
+	tables  = existingTables(engine)
+	report  = []
+	if not dryRun and SchemaVersion.__tablename__ not in tables:
+		raise RuntimeError('There is no FTS3 schema to migrate, it must be created first')
+
+	for migration in MIGRATIONS:
+		created = False
+		for table in migration.tables:
+			if table.name.lower() not in tables:
+				if not dryRun:
+					if logger:
+						logger.info('Creating the table %s' % table.name)
+					table.create(bind = engine)
+					tables.add(table.name.lower())
+					created = True
+				report.append({'table': table.name, 'status': dryRun and 'missing' or 'created',
+							   'version': '%d.%d.%d' % migration.version})
+
+		for path in migration.paths:
+			index   = path.index
+			entry   = {
+				'index': index.name,
+				'table': index.table.name,
+				'columns': [c.name for c in index.columns],
+				'endpoints': path.endpoints,
+				'version': '%d.%d.%d' % migration.version
+			}
+			if index.table.name.lower() not in tables:
+				entry['status'] = 'pending creation'
+				report.append(entry)
+				continue
+			entry['rows_before'], entry['plan_before'] = estimateRows(engine, path.sample)
+
+			if index.name.lower() in existingIndexes(engine, index.table):
+				entry['status'] = 'exists'
+			elif dryRun:
+				entry['status'] = 'missing'
+			else:
+				if logger:
+					logger.info('Creating %s on %s' % (index.name, index.table.name))
+				index.create(bind = engine)
+				entry['status'] = 'created'
+				entry['rows_after'], entry['plan_after'] = estimateRows(engine, path.sample)
+			report.append(entry)
+
+		if created and migration.populate:
+			migration.populate(session)
+
+		if not dryRun and migration.version > version:
+			(major, minor, patch) = migration.version
+			session.add(SchemaVersion(major = major, minor = minor, patch = patch))
+			session.commit()
+			version = migration.version
+			if logger:
+				logger.info('Schema version set to %d.%d.%d' % migration.version)
+
+	return report
@@ -0,0 +1,47 @@
+from pylons.controllers.util import abort
+import base64
+import json
+import urllib
+
+
+def getPageSize(request, maximum):
+	"""
+	Returns the page size asked with 'limit', or None if the client did not
+	ask for pagination. It can not go over maximum.
+	"""
+	limit = request.params.get('limit', None)
+	if not limit:
+		return None
+	try:
+		limit = int(limit)
+	except ValueError:
+		abort(400, 'Invalid limit "%s"' % limit)
+	if limit <= 0:
+		abort(400, 'The limit must be a positive number')
+	return min(limit, maximum)
+
+
+
+def encodeCursor(values):
+	"""Builds an opaque cursor from a list of JSON serializable values"""
+	return base64.urlsafe_b64encode(json.dumps(values))
+
+
+
+def decodeCursor(cursor, length):
+	"""Returns the list of values encoded within the cursor, or aborts with 400"""
+	try:
+		values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+		if type(values) is list and len(values) == length:
+			return values
+	except (ValueError, TypeError):
+		pass
+	abort(400, 'Invalid cursor "%s"' % cursor)
+
+
+
+def setNextLink(request, response, cursor):
+	"""Sets the Link header pointing to the page following cursor"""
+	params = [(k, v.encode('utf-8')) for (k, v) in request.GET.items() if k != 'after']
+	params.append(('after', cursor))
+	response.headers['Link'] = '<%s?%s>; rel="next"' % (request.path_url, urllib.urlencode(params))
@@ -0,0 +1,44 @@
+from pylons.controllers.util import abort
+from sqlalchemy.orm import class_mapper, ColumnProperty
+
+
+def getFields(request, prefix = None):
+	"""
+	Returns the list of fields asked with 'fields', None if the client did
+	not ask for a projection.
+	If prefix is given, only the fields of the related resource are returned
+	(i.e. 'files.file_state' with the prefix 'files')
+	"""
+	fields = request.params.get('fields', None)
+	if fields is None:
+		return None
+	fields = filter(None, map(lambda f: f.strip(), fields.split(',')))
+	if prefix is None:
+		return filter(lambda f: '.' not in f, fields)
+	prefix += '.'
+	return [f[len(prefix):] for f in fields if f.startswith(prefix)]
+
+
+
+class Projection(object):
+	"""
+	Set of columns of a mapped class asked by the client.
+	Columns in required are selected as well, since they are needed to
+	process the request, but they are not returned unless asked.
+	"""
+
+	def __init__(self, klass, fields, required = []):
+		available = [prop.key for prop in class_mapper(klass).iterate_properties
+					 if isinstance(prop, ColumnProperty)]
+		for field in fields:
+			if field not in available:
+				abort(400, 'Unknown field "%s"' % field)
+
+		self.fields  = fields
+		selected     = fields + [r for r in required if r not in fields]
+		self.columns = [getattr(klass, f) for f in selected]
+
+
+	def toDict(self, row):
+		"""Returns only the fields asked from the row (or object)"""
+		return dict([(f, getattr(row, f)) for f in self.fields])
@@ -0,0 +1,79 @@
+import json
+import jsonschema
+
+
+def getSchema():
+    """Returns the job submission schema, as a new dictionary on each call"""
+    urlSchema = {'title': 'URL',
+                 'type':  'string'}
+        
+    fileSchema = {'title': 'Transfer',
+                  'type':  'object',
+                  'properties': {'sources':      {'type': 'array', 'items': urlSchema, 'minItems': 1, 'required': True},
+                                 'destinations': {'type': 'array', 'items': urlSchema, 'minItems': 1, 'required': True},
+                                 'metadata':     {'type': ['object', 'string', 'null']},
+                                 'filesize':     {'type': ['integer','null'], 'minimum': 0},
+                                 'checksum':     {'type': ['string', 'null'], 'title': 'User defined checksum in the form algorithm:value'}
+                                 },
+                  }
+    
+    paramSchema = {'title': 'Job parameters',
+                   'type': ['object', 'null'],
+                   'properties': {'verify_checksum':   {'type': ['boolean', 'null']},
+                                  'reuse':             {'type': ['boolean', 'null'], 'title': 'If set to true, srm sessions will be reused'},
+                                  'spacetoken':        {'type': ['string', 'null'], 'title': 'Destination space token'},
+                                  'bring_online':      {'type': ['integer', 'null'], 'title': 'Bring online operation timeout'},
+                                  'copy_pin_lifetime': {'type': ['integer', 'null'], 'title': 'Minimum lifetime when bring online is used. -1 means no bring online', 'minimum': -1},
+                                  'job_metadata':      {'type': ['object', 'string', 'null']},
+                                  'source_spacetoken': {'type': ['string', 'null']},
+                                  'overwrite':         {'type': ['boolean', 'null']},
+                                  'gridftp':           {'type': ['string', 'null'], 'title': 'Reserved for future usage'}
+                                  },
+                   }
+        
+    schema = {'title':      'Job submission',
+              'type':       'object',
+              'properties': {'params': paramSchema,
+                             'files': {'type': 'array',
+                                       'required': True,
+                                       'items': fileSchema},
+                             'idempotency_key': {'type': ['string', 'null'],
+                                                 'maxLength': 255,
+                                                 'title': 'Retrying with the same key returns the job created the first time'}
+                            }
+              }
+    
+    return schema
+
+
+# Validators compiled once, when the module is loaded
+_submissionValidator = jsonschema.Draft3Validator(getSchema())
+_transferValidator   = jsonschema.Draft3Validator(getSchema()['properties']['files']['items'])
+_paramsValidator     = jsonschema.Draft3Validator(getSchema()['properties']['params'])
+
+# The schema document, serialized only once
+SUBMIT_SCHEMA_JSON = json.dumps(getSchema(), indent = 2, sort_keys = True)
+
+
+def _firstError(validator, instance):
+    for error in validator.iter_errors(instance):
+        path = '/'.join(map(str, error.path))
+        if path:
+            return "%s: %s" % (path, error.message)
+        return error.message
+    return None
+
+
+def submissionError(submitted):
+    """Returns why the job submission is not valid, or None if it is"""
+    return _firstError(_submissionValidator, submitted)
+
+
+def transferError(transfer):
+    """Returns why a single entry of 'files' is not valid, or None if it is"""
+    return _firstError(_transferValidator, transfer)
+
+
+def paramsError(params):
+    """Returns why the job parameters are not valid, or None if they are"""
+    return _firstError(_paramsValidator, params)
@@ -0,0 +1,133 @@
+from fts3.model import Job
+from fts3rest.lib.base import Session
+import atexit
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class _Waiter(object):
+	def __init__(self, sinceState):
+		self.sinceState = sinceState
+		self.state      = None
+		self.event      = threading.Event()
+
+
+
+class JobWatcher(object):
+	"""
+	Lets requests wait for state transitions of jobs. A single background
+	thread checks the state of all the watched jobs, with one query per
+	tick, and wakes up the requests waiting on the jobs that changed.
+	Each waiting request holds a worker, so no more than maxWaiters (if not 0)
+	requests wait at the same time.
+	"""
+
+	def __init__(self, interval = 2, chunkSize = 500, maxWaiters = 20):
+		self.interval   = interval
+		self.chunkSize  = chunkSize
+		self.maxWaiters = maxWaiters
+		self.watched    = {}
+		self.waiting    = 0
+		self.ticks      = 0
+		self.queries    = 0
+		self.woken      = 0
+		self.timedOut   = 0
+		self.refused    = 0
+		self._lock      = threading.Lock()
+		self._thread    = None
+		self._running   = False
+
+
+	def _start(self):
+		if self._thread is None or not self._thread.isAlive():
+			self._running = True
+			self._thread = threading.Thread(target = self._run, name = 'JobWatcher')
+			self._thread.daemon = True
+			self._thread.start()
+			atexit.register(self.stop)
+
+
+	def wait(self, jobId, sinceState, timeout):
+		"""
+		Blocks until the job leaves sinceState, or timeout expires.
+		Returns the new state, None on timeout, or right away if there are
+		already maxWaiters requests waiting.
+		"""
+		waiter = _Waiter(sinceState)
+		with self._lock:
+			if self.maxWaiters and self.waiting >= self.maxWaiters:
+				self.refused += 1
+				return None
+			self.watched.setdefault(jobId, []).append(waiter)
+			self.waiting += 1
+			self._start()
+		try:
+			waiter.event.wait(timeout)
+		finally:
+			with self._lock:
+				waiters = self.watched.get(jobId, [])
+				if waiter in waiters:
+					waiters.remove(waiter)
+					self.waiting -= 1
+				if not waiters:
+					self.watched.pop(jobId, None)
+				if waiter.state is None:
+					self.timedOut += 1
+		return waiter.state
+
+
+	def stop(self):
+		self._running = False
+
+
+	def _getStates(self, jobIds):
+		"""Returns a dictionary job_id => job_state for the given jobs"""
+		session = Session.session_factory()
+		try:
+			states = {}
+			for i in xrange(0, len(jobIds), self.chunkSize):
+				chunk = jobIds[i:i + self.chunkSize]
+				states.update(session.query(Job.job_id, Job.job_state).filter(Job.job_id.in_(chunk)).all())
+				self.queries += 1
+			return states
+		finally:
+			session.close()
+
+
+	def _run(self):
+		while self._running:
+			time.sleep(self.interval)
+			with self._lock:
+				jobIds = self.watched.keys()
+			if not jobIds:
+				continue
+
+			try:
+				states = self._getStates(jobIds)
+			except Exception:
+				log.exception('Failed to check the state of the watched jobs')
+				continue
+			self.ticks += 1
+
+			with self._lock:
+				for (jobId, state) in states.iteritems():
+					for waiter in self.watched.get(jobId, []):
+						if state != waiter.sinceState and not waiter.event.isSet():
+							waiter.state = state
+							waiter.event.set()
+							self.woken += 1
+
+
+	def stats(self):
+		with self._lock:
+			return {'watched_jobs': len(self.watched),
+					'waiting':      self.waiting,
+					'max_waiters':  self.maxWaiters,
+					'ticks':        self.ticks,
+					'queries':      self.queries,
+					'woken':        self.woken,
+					'timed_out':    self.timedOut,
+					'refused':      self.refused}
@@ -0,0 +1,179 @@
+from fts3rest.lib.base import Session
+from fts3rest.lib.bulk import insertJobs
+import atexit
+import collections
+import logging
+import Queue
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class JobWriter(object):
+	"""
+	Stores the queued jobs from a background thread. All the jobs waiting
+	when the thread wakes up, up to batchSize, are written in a single commit.
+	Jobs still queued when the process exits are written before leaving,
+	but they are lost if the process dies. The last maxFailed jobs that could
+	not be written are kept, marked as FAILED, so their submitters can find
+	out. All of this is per process.
+	"""
+
+	def __init__(self, maxQueued = 1000, batchSize = 100, maxFailed = 1000):
+		self.queue      = Queue.Queue(maxQueued)
+		self.batchSize  = batchSize
+		self.maxFailed  = maxFailed
+		self.pending    = {}
+		self.failedJobs = {}
+		self._failedIds = collections.deque()
+		self.batches    = 0
+		self.written    = 0
+		self.failed     = 0
+		self.lastBatch  = 0
+		self.maxBatch   = 0
+		self._lock      = threading.Lock()
+		self._thread    = None
+
+
+	def _start(self):
+		with self._lock:
+			if self._thread is None or not self._thread.isAlive():
+				self._thread = threading.Thread(target = self._run, name = 'JobWriter')
+				self._thread.daemon = True
+				self._thread.start()
+				atexit.register(self.stop)
+
+
+	def put(self, job):
+		"""Queues the job. Raises Queue.Full if there is no room left"""
+		with self._lock:
+			self.pending[job.job_id] = job
+		try:
+			self.queue.put_nowait(job)
+		except Queue.Full:
+			with self._lock:
+				del self.pending[job.job_id]
+			raise
+		self._start()
+
+
+	def get(self, jobId):
+		"""Returns the job if it is queued and not yet stored, None otherwise"""
+		return self.pending.get(jobId, None)
+
+
+	def getFailed(self, jobId):
+		"""Returns the job if it was accepted, but could not be stored, None otherwise"""
+		with self._lock:
+			return self.failedJobs.get(jobId, None)
+
+
+	def getByKey(self, dlgId, key):
+		"""Returns the queued job submitted with the given idempotency key, if any"""
+		with self._lock:
+			for job in self.pending.itervalues():
+				idempotency = getattr(job, '_idempotency', None)
+				if idempotency is not None and\
+				   idempotency.dlg_id == dlgId and idempotency.idempotency_key == key:
+					return job
+		return None
+
+
+	def stop(self, timeout = 30):
+		"""Writes whatever is queued, and stops the thread"""
+		if self._thread is not None and self._thread.isAlive():
+			self.queue.put(None)
+			self._thread.join(timeout)
+			if self._thread.isAlive():
+				with self._lock:
+					lost = self.pending.keys()
+				log.error('%d accepted jobs could not be stored within %d seconds, and are lost: %s%s' %
+						  (len(lost), timeout, ', '.join(lost[:100]), len(lost) > 100 and '...' or ''))
+
+
+	def _run(self):
+		running = True
+		while running:
+			batch = []
+			job = self.queue.get()
+			while job is not None:
+				batch.append(job)
+				if len(batch) >= self.batchSize:
+					break
+				try:
+					job = self.queue.get_nowait()
+				except Queue.Empty:
+					break
+			running = job is not None
+			if batch:
+				self._write(batch)
+
+
+	def _insert(self, session, jobs):
+		insertJobs(session, jobs)
+		session.commit()
+
+
+	def _write(self, batch):
+		session = Session.session_factory()
+		written = 0
+		failed  = []
+		try:
+			try:
+				self._insert(session, batch)
+				written = len(batch)
+			except Exception:
+				session.rollback()
+				log.exception('Failed to write a batch of %d jobs, trying one by one' % len(batch))
+				# Do not lose the whole batch because of one bad job
+				for job in batch:
+					try:
+						self._insert(session, [job])
+						written += 1
+					except Exception, e:
+						session.rollback()
+						log.exception('Failed to write the job %s' % job.job_id)
+						failed.append((job, e))
+		finally:
+			session.close()
+
+		with self._lock:
+			for (job, error) in failed:
+				self._markFailed(job, error)
+			for job in batch:
+				self.pending.pop(job.job_id, None)
+			self.batches  += 1
+			self.written  += written
+			self.failed   += len(batch) - written
+			self.lastBatch = len(batch)
+			self.maxBatch  = max(self.maxBatch, len(batch))
+
+
+	def _markFailed(self, job, error):
+		"""Keeps job as failed, forgetting the oldest one if there are too many"""
+		reason = 'The job could not be stored: %s' % str(error)
+		job.job_state = 'FAILED'
+		job.reason    = reason
+		for file in job.files:
+			file.file_state = 'FAILED'
+			file.reason     = reason
+		self.failedJobs[job.job_id] = job
+		self._failedIds.append(job.job_id)
+		while len(self._failedIds) > self.maxFailed:
+			self.failedJobs.pop(self._failedIds.popleft(), None)
+
+
+	def stats(self):
+		averageBatch = None
+		if self.batches:
+			averageBatch = float(self.written + self.failed) / self.batches
+		return {'queued':        self.queue.qsize(),
+				'capacity':      self.queue.maxsize,
+				'pending':       len(self.pending),
+				'batches':       self.batches,
+				'written':       self.written,
+				'failed':        self.failed,
+				'failed_kept':   len(self.failedJobs),
+				'last_batch':    self.lastBatch,
+				'max_batch':     self.maxBatch,
+				'average_batch': averageBatch}
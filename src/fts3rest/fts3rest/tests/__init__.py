@@ -14,9 +14,12 @@ from paste.deploy import loadapp
 from paste.script.appinstall import SetupCommand
 from pylons import url
 from routes.util import URLGenerator
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from webtest import TestApp
 
 import pylons.test
+import re
 
 from fts3rest.lib.middleware import fts3auth
 from fts3rest.lib.base import Session
@@ -29,6 +32,14 @@ SetupCommand('setup-app').run([pylons.test.pylonsapp.config['__file__']])
 
 environ = {}
 
+# Statements sent to the database, recorded for the query count assertions
+_statements = []
+
+def _recordStatement(conn, cursor, statement, parameters, context, executemany):
+	_statements.append(statement)
+
+event.listen(Engine, 'before_cursor_execute', _recordStatement)
+
 class TestController(TestCase):
 
 	def __init__(self, *args, **kwargs):
@@ -50,6 +61,10 @@ class TestController(TestCase):
 	def getUserCredentials(self):
 		return fts3auth.UserCredentials(self.app.extra_environ, {'public': {'*': 'all'}})
 
+	def _invalidateCredentialCache(self, creds):
+		appGlobals = pylons.test.pylonsapp.config['pylons.app_globals']
+		appGlobals.credentialCache.invalidate((creds.delegation_id, creds.user_dn))
+
 	def pushDelegation(self, lifetime = timedelta(hours = 7)):
 		creds = self.getUserCredentials()
 		delegated = Credential()
@@ -61,6 +76,7 @@ class TestController(TestCase):
 		
 		Session.merge(delegated)
 		Session.commit()
+		self._invalidateCredentialCache(creds)
 		
 	
 	def popDelegation(self):
@@ -70,6 +86,20 @@ class TestController(TestCase):
 			if delegated:
 				Session.delete(delegated)
 				Session.commit()
+			self._invalidateCredentialCache(cred)
 	
+	def captureStatements(self, tables, f, *args, **kwargs):
+		"""Calls f, and returns the statements that touched any of the tables"""
+		del _statements[:]
+		f(*args, **kwargs)
+		regex = re.compile('\\b(%s)\\b' % '|'.join(tables), re.IGNORECASE)
+		return filter(lambda s: regex.search(s), _statements)
+
+
+	def countStatements(self, tables, f, *args, **kwargs):
+		"""Calls f, and returns how many statements touched any of the tables"""
+		return len(self.captureStatements(tables, f, *args, **kwargs))
+
+
 	def tearDown(self):
 		self.popDelegation()
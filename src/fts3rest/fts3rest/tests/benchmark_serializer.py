@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Compares the serialization of job listings with ClassEncoder and with the
+encoder it replaced, which kept the visited objects in a list.
+Usage: benchmark_serializer.py [max number of jobs]
+"""
+from datetime import datetime
+from fts3.model import Job, File
+from fts3.model.base import Base
+from fts3rest.lib.helpers import ClassEncoder
+import json
+import sys
+import time
+
+
+class LegacyClassEncoder(json.JSONEncoder):
+	
+	def __init__(self, *args, **kwargs):
+		super(LegacyClassEncoder, self).__init__(*args, **kwargs)
+		self.visited = []
+
+
+	def default(self, obj):
+		if isinstance(obj, Base):
+			self.visited.append(obj)
+				
+		if isinstance(obj, datetime):
+			return obj.strftime('%Y-%m-%dT%H:%M:%S%z')
+		elif isinstance(obj, Base) or isinstance(obj, object):			
+			values = {}
+			for (k, v) in obj.__dict__.iteritems():
+				if not k.startswith('_') and v not in self.visited:
+					values[k] = v
+					if isinstance(v, Base):
+						self.visited.append(v)
+					
+			return values
+		else:
+			return super(LegacyClassEncoder, self).default(obj)
+
+
+
+def buildJobs(n, filesPerJob = 2):
+	now = datetime(2013, 6, 1, 12, 30, 15)
+	jobs = []
+	for i in xrange(n):
+		job = Job(job_id = '%036d' % i, job_state = 'SUBMITTED', vo_name = 'dteam',
+				  user_dn = '/DC=ch/DC=cern/CN=user', submit_time = now, priority = 3,
+				  reason = None, job_metadata = {'index': i})
+		job.files = [File(file_index = j, file_state = 'SUBMITTED',
+						  source_surl = 'srm://source/file%d' % j, dest_surl = 'srm://dest/file%d' % j,
+						  filesize = 1024.0, start_time = now)
+					 for j in xrange(filesPerJob)]
+		jobs.append(job)
+	return jobs
+
+
+
+def timeEncoder(encoder, jobs):
+	start = time.time()
+	serialized = json.dumps(jobs, cls = encoder, indent = 2, sort_keys = True)
+	return (time.time() - start, serialized)
+
+
+
+if __name__ == '__main__':
+	maxJobs = 100000
+	if len(sys.argv) > 1:
+		maxJobs = int(sys.argv[1])
+	# The legacy encoder is quadratic, so it is not run with the largest listings
+	maxLegacy = 10000
+
+	print "%10s %12s %12s" % ('Jobs', 'Current (s)', 'Legacy (s)')
+	n = 100
+	while n <= maxJobs:
+		jobs = buildJobs(n)
+		(current, serialized) = timeEncoder(ClassEncoder, jobs)
+		legacy = '-'
+		if n <= maxLegacy:
+			(elapsed, legacySerialized) = timeEncoder(LegacyClassEncoder, jobs)
+			legacy = '%.3f' % elapsed
+			if legacySerialized != serialized:
+				print "Outputs differ for %d jobs!" % n
+				sys.exit(1)
+		print "%10d %12.3f %12s" % (n, current, legacy)
+		n *= 10
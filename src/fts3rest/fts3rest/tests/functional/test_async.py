@@ -0,0 +1,55 @@
+from fts3rest.tests import TestController
+from fts3rest.lib.base import Session
+from fts3.model import Job
+from routes import url_for
+import json
+import pylons.test
+import time
+
+
+class TestAsync(TestController):
+	
+	def setUp(self):
+		self.config = pylons.test.pylonsapp.config
+		self.config['fts3.AsyncSubmit'] = 'true'
+	
+	
+	def tearDown(self):
+		self.config['fts3.AsyncSubmit'] = 'false'
+		super(TestAsync, self).tearDown()
+	
+	
+	def _waitWritten(self, jobId, timeout = 10):
+		writer = self.config['pylons.app_globals'].jobWriter
+		limit = time.time() + timeout
+		while writer.get(jobId) is not None and time.time() < limit:
+			time.sleep(0.1)
+		assert writer.get(jobId) is None
+	
+	
+	def test_submit_async(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  status = 202)
+		jobId = json.loads(answer.body)['job_id']
+		
+		# Either still queued, or already stored
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId))
+		assert answer.status_int in [200, 202]
+		assert json.loads(answer.body)['job_state'] == 'SUBMITTED'
+		
+		self._waitWritten(jobId)
+		
+		dbJob = Session.query(Job).get(jobId)
+		assert dbJob is not None
+		assert len(dbJob.files) == 1
+		
+		stats = self.config['pylons.app_globals'].jobWriter.stats()
+		assert stats['written'] > 0
@@ -0,0 +1,120 @@
+from fts3rest.tests import TestController
+from fts3rest.lib.base import Session
+from fts3.model import BannedDN, BannedSE, Job
+from routes import url_for
+import json
+import pylons.test
+
+
+class TestBanned(TestController):
+	
+	def _banned(self):
+		return pylons.test.pylonsapp.config['pylons.app_globals'].bannedDNs
+	
+	
+	def _bannedSEs(self):
+		return pylons.test.pylonsapp.config['pylons.app_globals'].bannedSEs
+	
+	
+	def _ban(self, dn):
+		Session.merge(BannedDN(dn = dn, message = 'Testing'))
+		Session.commit()
+		self._banned().refresh(force = True)
+	
+	
+	def tearDown(self):
+		Session.query(BannedDN).delete()
+		Session.query(BannedSE).delete()
+		Session.commit()
+		self._banned().refresh(force = True)
+		self._bannedSEs().refresh(force = True)
+		super(TestBanned, self).tearDown()
+	
+	
+	def test_banned_dn(self):
+		self.setupGridsiteEnvironment()
+		self.app.get(url = url_for(controller = 'misc', action = 'whoami'),
+					 status = 200)
+		
+		self._ban(self.getUserCredentials().user_dn)
+		
+		self.app.get(url = url_for(controller = 'misc', action = 'whoami'),
+					 status = 403)
+	
+	
+	def test_snapshot_stats(self):
+		self._ban('/DC=ch/DC=cern/OU=Someone else')
+		stats = self._banned().stats()
+		
+		assert stats['entries'] == 1
+		assert stats['age'] >= 0
+	
+	
+	def _banSE(self, se):
+		Session.merge(BannedSE(se = se, message = 'Testing'))
+		Session.commit()
+		self._bannedSEs().refresh(force = True)
+	
+	
+	def test_banned_se_dropped(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._banSE('root://banned.ch')
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file']},
+						 {'sources':      ['root://source.es/file'],
+						  'destinations': ['root://banned.ch/file']}]}
+		
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  status = 200)
+		submitted = json.loads(answer.body)
+		
+		assert len(submitted['dropped_transfers']) == 1
+		assert submitted['dropped_transfers'][0]['dest_surl'] == 'root://banned.ch/file'
+		
+		dbJob = Session.query(Job).get(submitted['job_id'])
+		assert len(dbJob.files) == 1
+		assert dbJob.files[0].dest_se == 'root://dest.ch'
+	
+	
+	def test_banned_se_dropped_bulk(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._banSE('root://banned.ch')
+		
+		jobs = [{'files': [{'sources':      ['root://source.es/file'],
+							'destinations': ['root://dest.ch/file']}]},
+				{'files': [{'sources':      ['root://source.es/file'],
+							'destinations': ['root://dest.ch/file']},
+						   {'sources':      ['root://source.es/file'],
+							'destinations': ['root://banned.ch/file']}]}]
+		
+		answer = self.app.post(url = url_for(controller = 'jobs', action = 'submitBulk'),
+							   content_type = 'application/json',
+							   params = json.dumps(jobs),
+							   status = 200)
+		submitted = json.loads(answer.body)
+		
+		assert len(submitted) == 2
+		assert 'dropped_transfers' not in submitted[0]
+		assert len(submitted[1]['dropped_transfers']) == 1
+		assert submitted[1]['dropped_transfers'][0]['file_index'] == 1
+		assert submitted[1]['dropped_transfers'][0]['dest_surl'] == 'root://banned.ch/file'
+		
+		dbJob = Session.query(Job).get(submitted[1]['job_id'])
+		assert len(dbJob.files) == 1
+	
+	
+	def test_banned_se_all(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._banSE('root://banned.ch')
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://banned.ch/file']}]}
+		
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 403)
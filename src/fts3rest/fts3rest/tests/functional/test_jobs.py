@@ -1,8 +1,11 @@
 from fts3rest.tests import TestController
 from fts3rest.lib.base import Session
-from fts3.model import Job, File
+from fts3.model import Credential, IdempotencyKey, Job, File
+from datetime import datetime, timedelta
 from routes import url_for
 import json
+import pylons.test
+import time
 
 
 class TestJobs(TestController):
@@ -114,6 +117,228 @@ class TestJobs(TestController):
 		return jobId
 		
 		
+	def test_submit_statement_count(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		def submit(nFiles):
+			job = {'files': [{'sources':      ['root://source.es/file%d' % i],
+							  'destinations': ['root://dest.ch/file%d' % i],
+							  } for i in range(nFiles)]}
+			self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+						 params = json.dumps(job),
+						 status = 200)
+		
+		# One insert for the job, one batch for the files
+		assert self.countStatements(['t_job', 't_file'], submit, 1) == 2
+		assert self.countStatements(['t_job', 't_file'], submit, 50) == 2
+
+
+	def test_submit_short_delegation(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation(lifetime = timedelta(minutes = 30))
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 403)
+		
+		# A new delegation must be seen right away
+		self.pushDelegation()
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 200)
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 200)
+		
+		stats = pylons.test.pylonsapp.config['pylons.app_globals'].credentialCache.stats()
+		assert stats['hits'] > 0
+
+
+	def test_submit_delegation_renewed_elsewhere(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation(lifetime = timedelta(minutes = 30))
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 403)
+		
+		# Renewed through another process, so this cache is not invalidated
+		creds = self.getUserCredentials()
+		credential = Session.query(Credential).get((creds.delegation_id, creds.user_dn))
+		credential.termination_time = datetime.now() + timedelta(hours = 7)
+		Session.commit()
+		
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 200)
+
+
+	def test_submit_idempotent(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		
+		def submit():
+			answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+								  params = json.dumps(job),
+								  headers = {'Idempotency-Key': 'my-unique-key'},
+								  status = 200)
+			return json.loads(answer.body)['job_id']
+		
+		jobId = submit()
+		# The retry must not write anything
+		assert self.countStatements(['t_job', 't_file'], submit) == 0
+		assert submit() == jobId
+		
+		# The key can be given within the body too
+		job['idempotency_key'] = 'another-key'
+		first  = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job), status = 200)
+		second = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job), status = 200)
+		assert json.loads(first.body)['job_id'] == json.loads(second.body)['job_id']
+		assert json.loads(first.body)['job_id'] != jobId
+
+
+	def test_submit_idempotent_expired(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		creds = self.getUserCredentials()
+		Session.merge(IdempotencyKey(dlg_id = creds.delegation_id, idempotency_key = 'old-key',
+									 job_id = 'old-job', expiration = datetime.now() - timedelta(hours = 1)))
+		Session.commit()
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  headers = {'Idempotency-Key': 'old-key'},
+							  status = 200)
+		jobId = json.loads(answer.body)['job_id']
+		assert jobId != 'old-job'
+		
+		Session.expire_all()
+		record = Session.query(IdempotencyKey).get((creds.delegation_id, 'old-key'))
+		assert record.job_id == jobId
+
+
+	def test_submit_bulk(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		jobs = [{'files': [{'sources':      ['root://source.es/file%d' % i],
+							'destinations': ['root://dest.ch/file%d' % i],
+							}]} for i in range(3)]
+		
+		answer = self.app.post(url = url_for(controller = 'jobs', action = 'submitBulk'),
+							   content_type = 'application/json',
+							   params = json.dumps(jobs),
+							   status = 200)
+		
+		submitted = json.loads(answer.body)
+		assert len(submitted) == 3
+		
+		for (i, entry) in enumerate(submitted):
+			assert 'dropped_transfers' not in entry
+			dbJob = Session.query(Job).get(entry['job_id'])
+			assert dbJob.job_state == 'SUBMITTED'
+			assert dbJob.source_se == 'root://source.es'
+			assert len(dbJob.files) == 1
+			assert dbJob.files[0].source_surl == 'root://source.es/file%d' % i
+			assert dbJob.files[0].file_id is not None
+
+
+	def test_submit_bulk_not_list(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }]}
+		
+		self.app.post(url = url_for(controller = 'jobs', action = 'submitBulk'),
+					  content_type = 'application/json',
+					  params = json.dumps(job),
+					  status = 400)
+
+
+	def test_submit_stream(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = '{"params": {"overwrite": true, "copy_pin_lifetime": 3600},' +\
+			  ' "files": [' +\
+			  ', '.join(['{"sources": ["root://source.es/file%d"], "destinations": ["root://dest.ch/file%d"]}' % (i, i)
+						 for i in range(5)]) +\
+			  ']}'
+		
+		answer = self.app.post(url = url_for(controller = 'jobs', action = 'submitStream'),
+							   content_type = 'application/json',
+							   params = job,
+							   status = 200)
+		
+		jobId = json.loads(answer.body)['job_id']
+		dbJob = Session.query(Job).get(jobId)
+		
+		assert dbJob.job_state == 'STAGING'
+		assert dbJob.source_se == 'root://source.es'
+		assert dbJob.dest_se   == 'root://dest.ch'
+		assert dbJob.overwrite_flag == True
+		assert len(dbJob.files) == 5
+		for f in dbJob.files:
+			assert f.file_state == 'STAGING'
+			assert f.source_surl == 'root://source.es/file%d' % f.file_index
+
+
+	def test_submit_stream_params_after_files(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = '{"files": [{"sources": ["root://source.es/file"], "destinations": ["root://dest.ch/file"]}],' +\
+			  ' "params": {"overwrite": true}}'
+		
+		self.app.post(url = url_for(controller = 'jobs', action = 'submitStream'),
+					  content_type = 'application/json',
+					  params = job,
+					  status = 400)
+
+
+	def test_submit_invalid_params(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		job = {'files': [{'sources':      ['root://source.es/file'],
+						  'destinations': ['root://dest.ch/file'],
+						  }],
+			   'params': {'reuse': 'A string'}}
+		
+		self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+					 params = json.dumps(job),
+					 status = 400)
+
+
+	def test_submit_schema(self):
+		self.setupGridsiteEnvironment()
+		answer = self.app.get(url = url_for(controller = 'schema', action = 'submit'),
+							  status = 200)
+		schema = json.loads(answer.body)
+		assert 'files' in schema['properties']
+
+
 	def test_submit_no_transfers(self):
 		self.setupGridsiteEnvironment()
 		self.pushDelegation()
@@ -241,6 +466,146 @@ class TestJobs(TestController):
 			assert f.file_state == 'CANCELED'
 
 
+	def _submitFiles(self, nFiles):
+		job = {'files': [{'sources':      ['root://source.es/file%d' % i],
+						  'destinations': ['root://dest.ch/file%d' % i]} for i in range(nFiles)]}
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  status = 200)
+		return json.loads(answer.body)['job_id']
+
+
+	def _statementCounts(self, jobId):
+		"""Number of statements on t_job and t_file run by each endpoint for the job"""
+		count = lambda *args, **kwargs: self.countStatements(['t_job', 't_file'], self.app.get, *args, **kwargs)
+		counts = {
+			'index':      count(url = url_for(controller = 'jobs', action = 'index'), status = 200),
+			'show':       count(url = url_for(controller = 'jobs', action = 'show', id = jobId), status = 200),
+			'files':      count(url = url_for(controller = 'jobs', action = 'showField', id = jobId, field = 'files'),
+								status = 200),
+			'job_state':  count(url = url_for(controller = 'jobs', action = 'showField', id = jobId, field = 'job_state'),
+								status = 200),
+			'status':     count(url = url_for(controller = 'jobs', action = 'status'), params = {'ids': jobId},
+								status = 200)
+		}
+		statements = self.captureStatements(['t_job', 't_file'], self.app.delete,
+											url = url_for(controller = 'jobs', action = 'cancel', id = jobId),
+											status = 200)
+		counts['cancel']         = len(statements)
+		counts['cancel_selects'] = len(filter(lambda s: s.strip().upper().startswith('SELECT'), statements))
+		return counts
+
+
+	def test_statement_counts(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		counts = self._statementCounts(self._submitFiles(1))
+		assert counts['index'] == 1
+		# Version tag (job and file states), then the job joined with its files
+		assert counts['show'] == 3
+		assert counts['files'] == 3
+		assert counts['job_state'] == 3
+		assert counts['status'] == 2
+		# Cancel checks the job and counts its active files, then two updates,
+		# and loads the job joined with its files
+		assert counts['cancel_selects'] == 3
+		assert counts['cancel'] == 5
+		
+		# The same, whatever the number of files
+		assert self._statementCounts(self._submitFiles(20)) == counts
+
+
+	def test_show_files(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		job = {'files': [{'sources': ['root://source.es/file%d' % i],
+						  'destinations': ['root://dest.ch/file%d' % i]} for i in range(5)]}
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  status = 200)
+		jobId = json.loads(answer.body)['job_id']
+		
+		# Fail one of them
+		failed = Session.query(File).filter(File.job_id == jobId).order_by(File.file_id).all()[3]
+		failed.file_state = 'FAILED'
+		failedId = failed.file_id
+		Session.merge(failed)
+		Session.commit()
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'showFiles', id = jobId),
+							  params = {'file_state': 'FAILED', 'fields': 'file_id,dest_surl'},
+							  status = 200)
+		assert json.loads(answer.body) == [{'file_id': failedId, 'dest_surl': 'root://dest.ch/file3'}]
+		
+		# Walk them two by two
+		seen = []
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'showFiles', id = jobId),
+							  params = {'limit': 2}, status = 200)
+		while True:
+			page = json.loads(answer.body)
+			assert len(page) <= 2
+			seen.extend(map(lambda f: f['dest_surl'], page))
+			if 'Link' not in answer.headers:
+				break
+			link = answer.headers['Link']
+			answer = self.app.get(url = link[1:link.index('>')], status = 200)
+		assert seen == ['root://dest.ch/file%d' % i for i in range(5)]
+		
+		self.app.get(url = url_for(controller = 'jobs', action = 'showFiles', id = jobId),
+					 params = {'limit': 2, 'after': 'bad'}, status = 400)
+
+
+	def test_cancel_twice(self):
+		jobId = self.test_submit()
+		self.app.delete(url = url_for(controller = 'jobs', action = 'cancel', id = jobId),
+						status = 200)
+		answer = self.app.delete(url = url_for(controller = 'jobs', action = 'cancel', id = jobId),
+								 status = 200)
+		job = json.loads(answer.body)
+		assert job['job_state'] == 'CANCELED'
+		for f in job['files']:
+			assert f['file_state'] == 'CANCELED'
+
+
+	def test_cancel_many(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		jobIds = []
+		for i in range(3):
+			job = {'files': [{'sources': ['root://cancel.source.es/file%d' % i],
+							  'destinations': ['root://cancel.dest.ch/file%d' % i]}]}
+			answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+								  params = json.dumps(job),
+								  status = 200)
+			jobIds.append(json.loads(answer.body)['job_id'])
+		otherId = self.test_submit()
+		
+		config = pylons.test.pylonsapp.config
+		config['fts3.CancelChunkSize'] = 2
+		try:
+			answer = self.app.delete(url = url_for(controller = 'jobs', action = 'cancelMany',
+												   source_se = 'root://cancel.source.es'),
+									 status = 200)
+		finally:
+			del config['fts3.CancelChunkSize']
+		progress = json.loads(answer.body)
+		
+		assert len(progress) == 3
+		assert progress[-1]['done'] == True
+		assert progress[-1]['chunks'] == 2
+		assert progress[-1]['jobs_canceled'] == 3
+		assert progress[-1]['files_canceled'] == 3
+		
+		for jobId in jobIds:
+			assert Session.query(Job).get(jobId).job_state == 'CANCELED'
+		assert Session.query(Job).get(otherId).job_state == 'SUBMITTED'
+		
+		# A filter is mandatory
+		self.app.delete(url = url_for(controller = 'jobs', action = 'cancelMany'),
+						status = 400)
+
+
 	def test_missing_job(self):
 		self.setupGridsiteEnvironment()
 		self.app.get(url = url_for(controller = 'jobs', action = 'show', id = '1234x'),
@@ -257,6 +622,96 @@ class TestJobs(TestController):
 		assert job['job_state'] == 'SUBMITTED'
 
 
+	def test_show_job_not_modified(self):
+		jobId = self.test_submit()
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  status = 200)
+		etag = answer.headers['ETag']
+		assert etag.startswith('W/')
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  headers = {'If-None-Match': etag},
+							  status = 304)
+		assert answer.body == ''
+		assert answer.headers['ETag'] == etag
+		
+		# Only the version is checked, the files are not loaded
+		statements = self.captureStatements(['t_file'], self.app.get,
+											url = url_for(controller = 'jobs', action = 'show', id = jobId),
+											headers = {'If-None-Match': etag},
+											status = 304)
+		assert len(statements) == 1
+		assert 'count' in statements[0].lower()
+		
+		# A transfer starting invalidates the tag, even without a state change
+		dbFile = Session.query(File).filter(File.job_id == jobId).first()
+		dbFile.start_time = datetime.now()
+		Session.commit()
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  headers = {'If-None-Match': etag},
+							  status = 200)
+		assert answer.headers['ETag'] != etag
+		etag = answer.headers['ETag']
+		
+		# A state change invalidates the tag
+		self.app.delete(url = url_for(controller = 'jobs', action = 'cancel', id = jobId), status = 200)
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  headers = {'If-None-Match': etag},
+							  status = 200)
+		assert answer.headers['ETag'] != etag
+
+
+	def test_show_job_wait(self):
+		jobId = self.test_submit()
+		
+		# Already in a different state
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  params = {'wait': 30, 'since_state': 'ACTIVE'},
+							  status = 200)
+		assert json.loads(answer.body)['job_state'] == 'SUBMITTED'
+		
+		# Times out
+		start = time.time()
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  params = {'wait': 1},
+							  status = 200)
+		assert time.time() - start >= 1
+		assert json.loads(answer.body)['job_state'] == 'SUBMITTED'
+		
+		self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+					 params = {'wait': 'abc'},
+					 status = 400)
+
+
+	def test_multiple_status(self):
+		jobIds = [self.test_submit() for i in range(3)]
+		
+		statements = self.captureStatements(['t_job', 't_file'], self.app.get,
+											url = url_for(controller = 'jobs', action = 'status'),
+											params = {'ids': ','.join(jobIds + ['1234x'])},
+											status = 200)
+		assert len(statements) == 2
+		
+		answer = self.app.post(url = url_for(controller = 'jobs', action = 'status'),
+							   content_type = 'application/json',
+							   params = json.dumps(jobIds + ['1234x']),
+							   status = 200)
+		statuses = json.loads(answer.body)
+		assert sorted(statuses.keys()) == sorted(jobIds + ['1234x'])
+		assert statuses['1234x']['status'] == 404
+		for jobId in jobIds:
+			assert statuses[jobId]['job_state'] == 'SUBMITTED'
+			assert len(statuses[jobId]['files']) == 1
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'status'),
+							  params = {'ids': ','.join(jobIds), 'files': 'false'},
+							  status = 200)
+		for job in json.loads(answer.body).values():
+			assert 'files' not in job
+		
+		self.app.get(url = url_for(controller = 'jobs', action = 'status'), status = 400)
+
+
 	def test_list_job(self):
 		jobId = self.test_submit()
 		answer = self.app.get(url = url_for(controller = 'jobs', action = 'index'),
@@ -266,6 +721,88 @@ class TestJobs(TestController):
 		assert jobId in map(lambda j: j['job_id'], jobList)
 
 
+	def test_list_job_streamed(self):
+		jobIds = set([self.test_submit() for i in range(5)])
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+							  status = 200)
+		assert answer.content_type == 'application/json'
+		jobList = json.loads(answer.body)
+		assert jobIds.issubset(set(map(lambda j: j['job_id'], jobList)))
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+							  params = {'vo_name': 'nonexistingvo'}, status = 200)
+		assert json.loads(answer.body) == []
+
+
+	def test_list_job_fields(self):
+		jobId = self.test_submit()
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+							  params = {'fields': 'job_id,job_state,vo_name'}, status = 200)
+		jobList = json.loads(answer.body)
+		
+		assert jobId in map(lambda j: j['job_id'], jobList)
+		for job in jobList:
+			assert sorted(job.keys()) == ['job_id', 'job_state', 'vo_name']
+
+
+	def test_show_job_fields(self):
+		jobId = self.test_submit()
+		statements = self.captureStatements(['t_job', 't_file'], self.app.get,
+										  url = url_for(controller = 'jobs', action = 'show', id = jobId),
+										  params = {'fields': 'job_id,job_state,files.file_state'},
+										  status = 200)
+		# Two for the version tag, then the projected job and files.
+		# None of them select the columns not asked
+		assert len(statements) == 4
+		for statement in statements:
+			assert 'reason' not in statement
+			assert 'job_metadata' not in statement
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+							  params = {'fields': 'job_id,job_state,files.file_state'},
+							  status = 200)
+		job = json.loads(answer.body)
+		assert job == {'job_id': jobId, 'job_state': 'SUBMITTED',
+					   'files': [{'file_state': 'SUBMITTED'}]}
+		
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'showField', id = jobId, field = 'files'),
+							  params = {'fields': 'source_surl'},
+							  status = 200)
+		assert json.loads(answer.body) == [{'source_surl': 'root://source.es/file'}]
+		
+		self.app.get(url = url_for(controller = 'jobs', action = 'show', id = jobId),
+					 params = {'fields': 'job_id,nonexisting'},
+					 status = 400)
+
+
+	def test_list_job_paginated(self):
+		jobIds = set([self.test_submit() for i in range(3)])
+		
+		seen = []
+		answer = self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+							  params = {'limit': 2}, status = 200)
+		while True:
+			page = json.loads(answer.body)
+			assert len(page) <= 2
+			seen.extend(map(lambda j: j['job_id'], page))
+			if 'Link' not in answer.headers:
+				break
+			link = answer.headers['Link']
+			assert link.endswith('; rel="next"')
+			answer = self.app.get(url = link[1:link.index('>')], status = 200)
+		
+		assert len(seen) == len(set(seen))
+		assert jobIds.issubset(set(seen))
+
+
+	def test_list_job_bad_cursor(self):
+		self.setupGridsiteEnvironment()
+		self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+					 params = {'limit': 2, 'after': 'notXaXcursor'}, status = 400)
+		self.app.get(url = url_for(controller = 'jobs', action = 'index'),
+					 params = {'limit': 0}, status = 400)
+
+
 	def test_no_file(self):
 		self.setupGridsiteEnvironment()
 		self.pushDelegation()
@@ -0,0 +1,163 @@
+from fts3rest.tests import TestController
+from fts3rest.lib.base import Session
+from fts3rest.lib.middleware.fts3auth.constants import *
+from fts3.model import Job, File
+from fts3rest.lib.cancel import cancelJobs
+from fts3rest.lib.counters import repairCounters
+from routes import url_for
+import json
+import pylons.test
+
+
+class TestSummary(TestController):
+	
+	def _summaryCache(self):
+		return pylons.test.pylonsapp.config['pylons.app_globals'].summaryCache
+	
+	
+	def _submit(self, source, destination):
+		job = {'files': [{'sources': [source], 'destinations': [destination]}]}
+		answer = self.app.put(url = url_for(controller = 'jobs', action = 'submit'),
+							  params = json.dumps(job),
+							  status = 200)
+		return json.loads(answer.body)['job_id']
+	
+	
+	def _getSummary(self, **params):
+		answer = self.app.get(url = url_for(controller = 'summary', action = 'index'),
+							  params = params, status = 200)
+		return json.loads(answer.body)
+	
+	
+	def test_summary(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._summaryCache().clear()
+		
+		self._submit('root://summary.source.es/file', 'root://summary.dest.ch/file')
+		self._submit('root://summary.source.es/file2', 'root://summary.dest.ch/file2')
+		self._submit('root://summary.source.es/file', 'root://summary.other.ch/file')
+		
+		summary = self._getSummary(source_se = 'root://summary.source.es')
+		assert len(summary) == 2
+		
+		toDest = filter(lambda g: g['dest_se'] == 'root://summary.dest.ch', summary)[0]
+		assert toDest['jobs'] == {'SUBMITTED': 2}
+		assert toDest['files'] == {'SUBMITTED': 2}
+		assert toDest['vo_name'] == self.getUserCredentials().vos[0]
+		
+		summary = self._getSummary(source_se = 'root://summary.source.es', states = 'FINISHED')
+		assert summary == []
+	
+	
+	def test_summary_cached(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._summaryCache().clear()
+		
+		before = self._getSummary(dest_se = 'root://summary.cached.ch')
+		self._submit('root://summary.cached.es/file', 'root://summary.cached.ch/file')
+		
+		# Served from the cache, so the new job is not there yet
+		statements = self.countStatements(['t_job', 't_file'], self._getSummary,
+										  dest_se = 'root://summary.cached.ch')
+		assert statements == 0
+		assert self._getSummary(dest_se = 'root://summary.cached.ch') == before
+		
+		self._summaryCache().clear()
+		after = self._getSummary(dest_se = 'root://summary.cached.ch')
+		assert after[0]['files'] == {'SUBMITTED': 1}
+	
+	
+	def _getQueue(self, **params):
+		answer = self.app.get(url = url_for(controller = 'summary', action = 'queue'),
+							  params = params, status = 200)
+		return dict([(c['file_state'], c['count']) for c in json.loads(answer.body)])
+	
+	
+	def test_queue_counters(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		jobId = self._submit('root://counter.source.es/file', 'root://counter.dest.ch/file')
+		self._submit('root://counter.source.es/file2', 'root://counter.dest.ch/file2')
+		assert self._getQueue(source_se = 'root://counter.source.es') == {'SUBMITTED': 2}
+		
+		self.app.delete(url = url_for(controller = 'jobs', action = 'cancel', id = jobId), status = 200)
+		assert self._getQueue(source_se = 'root://counter.source.es') == {'SUBMITTED': 1}
+		
+		# Reading them does not touch t_file
+		assert self.countStatements(['t_file'], self._getQueue, source_se = 'root://counter.source.es') == 0
+		
+		# Recomputing gives the same
+		repairCounters(Session)
+		assert self._getQueue(source_se = 'root://counter.source.es') == {'SUBMITTED': 1}
+	
+	
+	def _withLevel(self, level, f, *args, **kwargs):
+		"""Calls f with the transfer level granted to everyone set to level"""
+		config = pylons.test.pylonsapp.config
+		roles = config['fts3.Roles']
+		config['fts3.Roles'] = {'public': {'transfer': level}}
+		try:
+			return f(*args, **kwargs)
+		finally:
+			config['fts3.Roles'] = roles
+	
+	
+	def test_summary_scoped(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		self._summaryCache().clear()
+		
+		self._submit('root://scoped.source.es/file', 'root://scoped.dest.ch/file')
+		otherVo = self._submit('root://scoped.source.es/file2', 'root://scoped.dest.ch/file2')
+		otherDn = self._submit('root://scoped.source.es/file3', 'root://scoped.dest.ch/file3')
+		job = Session.query(Job).get(otherVo)
+		job.vo_name = 'othervo'
+		Session.merge(job)
+		job = Session.query(Job).get(otherDn)
+		job.user_dn = '/DC=ch/CN=Someone else'
+		Session.merge(job)
+		Session.commit()
+		repairCounters(Session)
+		
+		def countJobs(level):
+			summary = self._withLevel(level, self._getSummary, source_se = 'root://scoped.source.es')
+			return dict([(g['vo_name'], g['jobs']['SUBMITTED']) for g in summary])
+		
+		vo = self.getUserCredentials().vos[0]
+		assert countJobs(ALL) == {vo: 2, 'othervo': 1}
+		assert countJobs(VO) == {vo: 2}
+		assert countJobs(PRIVATE) == {vo: 1, 'othervo': 1}
+		
+		self._withLevel(VO, self.app.get, url = url_for(controller = 'summary', action = 'index'),
+						params = {'vo_name': 'othervo'}, status = 403)
+		
+		# The counters do not know about users
+		self._withLevel(PRIVATE, self.app.get, url = url_for(controller = 'summary', action = 'queue'),
+						status = 403)
+		queue = self._withLevel(VO, self._getQueue, source_se = 'root://scoped.source.es')
+		assert queue == {'SUBMITTED': 2}
+	
+	
+	def test_queue_counters_inactive_job(self):
+		self.setupGridsiteEnvironment()
+		self.pushDelegation()
+		
+		# The job is over, but the server has not updated its file yet
+		jobId = self._submit('root://inactive.source.es/file', 'root://inactive.dest.ch/file')
+		job = Session.query(Job).get(jobId)
+		job.job_state = 'FINISHED'
+		Session.merge(job)
+		Session.commit()
+		otherId = self._submit('root://inactive.source.es/file2', 'root://inactive.dest.ch/file2')
+		
+		# Canceled together with an active job, the file is not touched, and
+		# neither is its counter
+		assert cancelJobs(Session, [jobId, otherId], 'Test') == (1, 1)
+		Session.commit()
+		assert Session.query(File).filter(File.job_id == jobId).one().file_state == 'SUBMITTED'
+		assert self._getQueue(source_se = 'root://inactive.source.es') == {'SUBMITTED': 1}
+		repairCounters(Session)
+		assert self._getQueue(source_se = 'root://inactive.source.es') == {'SUBMITTED': 1}
@@ -0,0 +1,72 @@
+from fts3rest.lib.cache import LRUCache, TTLCache
+import time
+import unittest
+
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = LRUCache(10)
+        self.assertEqual('a', cache.get(1, lambda: 'a'))
+        self.assertEqual('a', cache.get(1, lambda: 'b'))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+
+    def test_bounded(self):
+        cache = LRUCache(2)
+        cache.get(1, lambda: 'a')
+        cache.get(2, lambda: 'b')
+        # Use 1, so 2 is the least recently used
+        cache.get(1, lambda: None)
+        cache.get(3, lambda: 'c')
+        
+        self.assertEqual(2, cache.stats()['entries'])
+        self.assertEqual('a', cache.get(1, lambda: None))
+        self.assertEqual('new', cache.get(2, lambda: 'new'))
+
+
+
+    def test_repeated_hits(self):
+        cache = LRUCache(3)
+        for i in range(3):
+            cache.get(i, lambda: i)
+        for i in range(1000):
+            cache.get(0, lambda: None)
+        # The order kept does not grow with the hits
+        self.assertTrue(len(cache._entries._order) < 100)
+        cache.get(3, lambda: 3)
+        self.assertEqual(0, cache.get(0, lambda: None))
+        self.assertEqual('new', cache.get(1, lambda: 'new'))
+
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_expiration(self):
+        cache = TTLCache(0.1)
+        cache.put('key', 'value')
+        self.assertEqual('value', cache.get('key'))
+        time.sleep(0.2)
+        self.assertEqual(None, cache.get('key'))
+        self.assertEqual(0.5, cache.stats()['hit_rate'])
+
+
+    def test_invalidate(self):
+        cache = TTLCache(60)
+        cache.put('key', 'value')
+        cache.invalidate('key')
+        self.assertEqual(None, cache.get('key'))
+
+
+    def test_disabled(self):
+        cache = TTLCache(0)
+        cache.put('key', 'value')
+        self.assertEqual(None, cache.get('key'))
+
+
+    def test_bounded(self):
+        cache = TTLCache(60, size = 2)
+        for i in range(5):
+            cache.put(i, i)
+        self.assertEqual(2, cache.stats()['entries'])
+        self.assertEqual(4, cache.get(4))
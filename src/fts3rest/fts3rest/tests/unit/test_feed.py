@@ -0,0 +1,108 @@
+from fts3rest.lib.feed import ChangeFeed
+from fts3.model import Job
+from collections import namedtuple
+import unittest
+
+
+Row = namedtuple('Row', ['job_id', 'state', 'vo_name', 'user_dn', 'source_se', 'dest_se'])
+
+
+class FakeFeed(ChangeFeed):
+    """Records the changes by hand instead of polling the database"""
+    def _start(self):
+        pass
+
+    def change(self, jobId, state, previous):
+        row = Row(jobId, state, 'dteam', '/DC=ch/CN=user', 'srm://a', 'srm://b')
+        self._notify('job', [(jobId, row)], {jobId: previous})
+
+
+
+class TestChangeFeed(unittest.TestCase):
+    def setUp(self):
+        self.feed = FakeFeed(history = 3)
+
+
+    def _collect(self, lastEventId = None, match = lambda e: True):
+        return [e for e in self.feed.listen(match, lastEventId, keepAlive = 0, duration = 0.1) if e is not None]
+
+
+    def test_unchanged(self):
+        self.feed.change('a', 'ACTIVE', 'ACTIVE')
+        self.assertEqual(0, self.feed.seq)
+
+
+    def test_resume(self):
+        self.feed.change('a', 'ACTIVE', 'SUBMITTED')
+        lastId = self.feed.eventId(self.feed.events[-1])
+        self.feed.change('a', 'FINISHED', 'ACTIVE')
+        self.feed.change('b', 'ACTIVE', 'SUBMITTED')
+
+        events = self._collect(lastId)
+        self.assertEqual(['FINISHED', 'ACTIVE'], [e.state for e in events])
+        self.assertEqual(['a', 'b'], [e.job_id for e in events])
+
+
+    def test_unknown_id(self):
+        self.feed.change('a', 'ACTIVE', 'SUBMITTED')
+        self.assertEqual([], self._collect('1234.1'))
+        self.assertEqual([], self._collect('garbage'))
+        # Another process, even if started at the same time
+        self.assertEqual([], self._collect('%s.0' % FakeFeed().epoch))
+
+
+    def test_filter(self):
+        self.feed.change('a', 'ACTIVE', 'SUBMITTED')
+        self.feed.change('b', 'ACTIVE', 'SUBMITTED')
+        events = self._collect('%s.0' % self.feed.epoch, lambda e: e.job_id == 'b')
+        self.assertEqual(['b'], [e.job_id for e in events])
+
+
+    def test_history_bounded(self):
+        for i in range(10):
+            self.feed.change('a', str(i), str(i - 1))
+        self.assertEqual(3, len(self.feed.events))
+        events = self._collect('%s.0' % self.feed.epoch)
+        self.assertEqual(['7', '8', '9'], [e.state for e in events])
+
+
+    def test_idle(self):
+        feed = FakeFeed(idle = 0)
+        feed.change('a', 'ACTIVE', 'SUBMITTED')
+        feed._jobs = {'a': 'ACTIVE'}
+        epoch = feed.epoch
+
+        # Someone is listening
+        feed.listeners = 1
+        self.assertFalse(feed._isIdle())
+        self.assertEqual(1, len(feed.events))
+
+        # Nobody anymore
+        feed.listeners = 0
+        self.assertTrue(feed._isIdle())
+        self.assertEqual(0, len(feed.events))
+        self.assertEqual(None, feed._jobs)
+        self.assertNotEqual(epoch, feed.epoch)
+
+
+    def test_scopes(self):
+        listener = self.feed.listen(lambda e: True, keepAlive = 0, duration = 0.1,
+                                    scope = {'vo_name': ['dteam', 'atlas']})
+        listener.next()
+        self.assertEqual({(('vo_name', ('atlas', 'dteam')),): 1}, self.feed._scopes)
+        listener.close()
+        self.assertEqual({}, self.feed._scopes)
+
+        columns = {'vo_name': Job.vo_name}
+        self.assertEqual(None, self.feed._scopeFilter([], columns))
+        self.assertEqual(None, self.feed._scopeFilter([None, (('vo_name', ('dteam',)),)], columns))
+        condition = self.feed._scopeFilter([(('vo_name', ('dteam',)),)], columns)
+        self.assertTrue('vo_name IN' in str(condition))
+
+
+    def test_entering_scope(self):
+        row = Row('a', 'ACTIVE', 'dteam', '/DC=ch/CN=user', 'srm://a', 'srm://b')
+        self.feed._notify('job', [('a', row)], {}, onlyKnown = True)
+        self.assertEqual(0, self.feed.seq)
+        self.feed._notify('job', [('a', row)], {}, onlyKnown = False)
+        self.assertEqual(1, self.feed.seq)
@@ -1,4 +1,5 @@
-from fts3rest.controllers.schema import _schema
+from fts3rest.lib.schema import getSchema
+from fts3rest.lib.schema import submissionError, transferError
 import unittest
 import jsonschema
 
@@ -27,7 +28,7 @@ class TestAuthorization(unittest.TestCase):
                         "gridftp": None
                       }
                     }
-        self.schema = _schema()
+        self.schema = getSchema()
 
 
     def test_validation(self):
@@ -58,3 +59,20 @@ class TestAuthorization(unittest.TestCase):
         self.data['files'][0]['sources'] = 'srm://srm.grid.sara.nl:8443/pnfs/grid.sara.nl/data/dteam/test.rand'
         self.assertRaises(jsonschema.ValidationError, jsonschema.validate, self.data, self.schema)
 
+
+    def test_compiled_validator(self):
+        self.assertEqual(None, submissionError(self.data))
+        self.data['params']['reuse'] = 'A string'
+        self.assertNotEqual(None, submissionError(self.data))
+
+
+    def test_transfer_validator(self):
+        self.assertEqual(None, transferError(self.data['files'][0]))
+        del self.data['files'][0]['sources']
+        self.assertNotEqual(None, transferError(self.data['files'][0]))
+
+
+    def test_string_metadata(self):
+        self.data['files'][0]['metadata'] = 'plain string'
+        self.data['params']['job_metadata'] = 'plain string'
+        jsonschema.validate(self.data, self.schema)
@@ -0,0 +1,58 @@
+from fts3rest.lib.jsonstream import JSONObjectStream, JSONStreamError
+from StringIO import StringIO
+import json
+import unittest
+
+
+
+class TestJSONObjectStream(unittest.TestCase):
+    def setUp(self):
+        self.data = {'params': {'overwrite': True, 'bring_online': 123456789},
+                     'files': [{'sources': ['srm://source/file%d' % i],
+                                'destinations': ['srm://dest/file%d' % i],
+                                'filesize': 1048576} for i in range(100)]}
+        self.body = json.dumps(self.data)
+
+
+    def _parse(self, body, chunkSize = 65536):
+        return list(JSONObjectStream(StringIO(body), len(body), arrays = ['files'],
+                                     chunkSize = chunkSize))
+
+
+    def test_small_chunks(self):
+        for chunkSize in [1, 2, 7, 100, 65536]:
+            parsed = self._parse(self.body, chunkSize)
+            files  = [v for (k, v) in parsed if k == 'files']
+            others = dict([(k, v) for (k, v) in parsed if k != 'files'])
+            self.assertEqual(self.data['files'], files)
+            self.assertEqual(self.data['params'], others['params'])
+
+
+    def test_empty(self):
+        self.assertEqual([], self._parse('{}'))
+        self.assertEqual([], self._parse('{"files": []}'))
+
+
+    def test_not_an_object(self):
+        self.assertRaises(JSONStreamError, self._parse, '[1, 2]')
+        self.assertRaises(JSONStreamError, self._parse, '')
+
+
+    def test_files_not_array(self):
+        self.assertRaises(JSONStreamError, self._parse, '{"files": {}}')
+
+
+    def test_truncated(self):
+        self.assertRaises(JSONStreamError, self._parse, self.body[:-10])
+
+
+    def test_trailing_data(self):
+        self.assertRaises(JSONStreamError, self._parse, self.body + 'garbage')
+
+
+    def test_malformed_fails_fast(self):
+        body = '{"files": [{"sources": [nonsense' + ' ' * 1000000 + ']}]}'
+        fd = StringIO(body)
+        stream = JSONObjectStream(fd, len(body), arrays = ['files'], chunkSize = 1024, maxValueSize = 4096)
+        self.assertRaises(JSONStreamError, list, stream)
+        self.assertTrue(fd.tell() < 10000)
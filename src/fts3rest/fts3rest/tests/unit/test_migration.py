@@ -0,0 +1,87 @@
+from fts3.model import Base, IdempotencyKey, QueueCounter, SchemaVersion
+from fts3rest.lib.migration import MIGRATIONS, currentVersion, migrate, verify
+import sqlalchemy
+import unittest
+
+
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sqlalchemy.orm.sessionmaker(bind = self.engine)()
+        self.session.add(SchemaVersion(major = 1, minor = 0, patch = 0))
+        self.session.commit()
+        # Like a database created before the indexes existed
+        for migration in MIGRATIONS:
+            for path in migration.paths:
+                path.index.drop(bind = self.engine)
+
+
+    def tearDown(self):
+        self.session.close()
+
+
+    def test_migrate(self):
+        self.assertEqual(sum([len(m.paths) for m in MIGRATIONS]), len(verify(self.engine)))
+
+        report = migrate(self.engine, self.session)
+        self.assertEqual(['created'], list(set([e['status'] for e in report])))
+        for entry in report:
+            self.assertTrue(entry['endpoints'])
+            self.assertTrue('plan_after' in entry)
+
+        self.assertEqual([], verify(self.engine))
+        self.assertEqual(MIGRATIONS[-1].version, currentVersion(self.session))
+
+
+    def test_migrate_twice(self):
+        migrate(self.engine, self.session)
+        report = migrate(self.engine, self.session)
+        self.assertEqual(['exists'], list(set([e['status'] for e in report])))
+        self.assertEqual(1 + len(MIGRATIONS), self.session.query(SchemaVersion).count())
+
+
+    def test_create_table(self):
+        QueueCounter.__table__.drop(bind = self.engine)
+        self.assertTrue(QueueCounter.__table__ in verify(self.engine))
+
+        report = migrate(self.engine, self.session)
+        self.assertTrue({'table': 't_queue_counter', 'status': 'created', 'version': '1.2.0'} in report)
+        self.assertEqual([], verify(self.engine))
+        self.assertEqual(0, self.session.query(QueueCounter).count())
+
+
+    def test_create_table_with_index(self):
+        IdempotencyKey.__table__.drop(bind = self.engine)
+        self.assertTrue(IdempotencyKey.__table__ in verify(self.engine))
+
+        report = migrate(self.engine, self.session)
+        self.assertTrue({'table': 't_idempotency_key', 'status': 'created', 'version': '1.3.0'} in report)
+        # Created together with the table
+        index = [e for e in report if e.get('index', None) == 'idx_idempotency_expiration'][0]
+        self.assertEqual('exists', index['status'])
+        self.assertEqual([], verify(self.engine))
+
+
+    def test_dry_run(self):
+        report = migrate(self.engine, self.session, dryRun = True)
+        self.assertEqual(['missing'], list(set([e['status'] for e in report])))
+        self.assertEqual(len(report), len(verify(self.engine)))
+        self.assertEqual((1, 0, 0), currentVersion(self.session))
+
+
+    def test_empty_schema(self):
+        engine  = sqlalchemy.create_engine('sqlite://')
+        session = sqlalchemy.orm.sessionmaker(bind = engine)()
+        nPaths  = sum([len(m.paths) for m in MIGRATIONS])
+        nTables = sum([len(m.tables) for m in MIGRATIONS])
+
+        self.assertEqual((0, 0, 0), currentVersion(session))
+        self.assertEqual(nPaths + nTables, len(verify(engine)))
+
+        report = migrate(engine, session, dryRun = True)
+        self.assertEqual(['missing'], list(set([e['status'] for e in report if 'index' not in e])))
+        self.assertEqual(['pending creation'], list(set([e['status'] for e in report if 'index' in e])))
+        self.assertRaises(RuntimeError, migrate, engine, session)
+        session.close()
@@ -0,0 +1,51 @@
+from datetime import datetime
+from fts3.model import Job, File
+from fts3rest.lib.helpers import ClassEncoder
+import json
+import unittest
+
+
+
+class TestClassEncoder(unittest.TestCase):
+    def setUp(self):
+        self.job = Job(job_id = '1234', job_state = 'SUBMITTED',
+                       submit_time = datetime(2013, 6, 1, 12, 30, 15, 1234))
+        self.job.files = [File(file_index = i, file_state = 'SUBMITTED') for i in range(3)]
+
+
+    def _encode(self, obj):
+        return json.loads(json.dumps(obj, cls = ClassEncoder))
+
+
+    def test_datetime(self):
+        self.assertEqual('2013-06-01T12:30:15', self._encode(datetime(2013, 6, 1, 12, 30, 15, 1234)))
+        self.assertEqual('2013-06-01T12:30:15', self._encode(self.job)['submit_time'])
+
+
+    def test_cycles(self):
+        # Each file references back the job, which must not be serialized again
+        encoded = self._encode(self.job)
+        self.assertEqual(3, len(encoded['files']))
+        for f in encoded['files']:
+            self.assertFalse('job' in f)
+
+
+    def test_not_loaded(self):
+        # Only what is set is serialized
+        encoded = self._encode(Job(job_id = '5678'))
+        self.assertEqual({'job_id': '5678'}, encoded)
+
+
+    def test_extra_attributes(self):
+        self.job.dropped_transfers = [{'file_index': 4}]
+        self.job._private = True
+        encoded = self._encode(self.job)
+        self.assertEqual([{'file_index': 4}], encoded['dropped_transfers'])
+        self.assertFalse('_private' in encoded)
+
+
+    def test_listing(self):
+        jobs = [Job(job_id = str(i), job_state = 'ACTIVE') for i in range(1000)]
+        encoded = self._encode(jobs)
+        self.assertEqual(1000, len(encoded))
+        self.assertEqual([str(i) for i in range(1000)], [j['job_id'] for j in encoded])
@@ -0,0 +1,71 @@
+from fts3rest.lib.watcher import JobWatcher
+import threading
+import time
+import unittest
+
+
+
+class FakeWatcher(JobWatcher):
+    """Takes the states from a dictionary instead of the database"""
+    def __init__(self, states, maxWaiters = 0):
+        super(FakeWatcher, self).__init__(interval = 0.05, maxWaiters = maxWaiters)
+        self.states = states
+
+    def _getStates(self, jobIds):
+        self.queries += 1
+        return dict([(j, self.states[j]) for j in jobIds if j in self.states])
+
+
+
+class TestJobWatcher(unittest.TestCase):
+    def setUp(self):
+        self.states  = {'a': 'SUBMITTED', 'b': 'ACTIVE'}
+        self.watcher = FakeWatcher(self.states)
+
+
+    def tearDown(self):
+        self.watcher.stop()
+
+
+    def test_timeout(self):
+        self.assertEqual(None, self.watcher.wait('a', 'SUBMITTED', 0.2))
+        self.assertEqual(0, self.watcher.stats()['watched_jobs'])
+        self.assertEqual(1, self.watcher.stats()['timed_out'])
+
+
+    def test_changed(self):
+        threading.Timer(0.1, lambda: self.states.update({'a': 'FINISHED'})).start()
+        self.assertEqual('FINISHED', self.watcher.wait('a', 'SUBMITTED', 5))
+
+
+    def test_one_query_per_tick(self):
+        results = []
+        waiters = [threading.Thread(target = lambda: results.append(self.watcher.wait(j, s, 0.3)))
+                   for (j, s) in [('a', 'SUBMITTED')] * 10 + [('b', 'ACTIVE')] * 10]
+        for w in waiters:
+            w.start()
+        for w in waiters:
+            w.join()
+        stats = self.watcher.stats()
+        self.assertEqual([None] * 20, results)
+        self.assertEqual(stats['ticks'], stats['queries'])
+
+
+    def test_max_waiters(self):
+        watcher = FakeWatcher(self.states, maxWaiters = 2)
+        waiters = [threading.Thread(target = watcher.wait, args = ('a', 'SUBMITTED', 0.5)) for i in range(2)]
+        for w in waiters:
+            w.start()
+        time.sleep(0.1)
+
+        # Over the limit, the answer is immediate
+        start = time.time()
+        self.assertEqual(None, watcher.wait('b', 'ACTIVE', 5))
+        self.assertTrue(time.time() - start < 1)
+
+        for w in waiters:
+            w.join()
+        watcher.stop()
+        stats = watcher.stats()
+        self.assertEqual(1, stats['refused'])
+        self.assertEqual(0, stats['waiting'])
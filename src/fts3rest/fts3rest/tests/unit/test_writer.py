@@ -0,0 +1,60 @@
+from fts3.model import Job, File
+from fts3rest.lib.writer import JobWriter
+import unittest
+
+
+
+class FakeWriter(JobWriter):
+    """Fails to insert the jobs in bad instead of writing into the database"""
+    def __init__(self, bad, maxFailed = 1000):
+        super(FakeWriter, self).__init__(batchSize = 10, maxFailed = maxFailed)
+        self.bad    = bad
+        self.stored = []
+
+    def _insert(self, session, jobs):
+        for job in jobs:
+            if job.job_id in self.bad:
+                raise ValueError('Can not store %s' % job.job_id)
+        self.stored.extend([job.job_id for job in jobs])
+
+
+
+def _job(jobId):
+    job = Job(job_id = jobId, job_state = 'SUBMITTED')
+    job.files = [File(file_state = 'SUBMITTED')]
+    return job
+
+
+
+class TestJobWriter(unittest.TestCase):
+    def test_failed_kept(self):
+        writer = FakeWriter(['b'])
+        jobs = map(_job, ['a', 'b', 'c'])
+        for job in jobs:
+            writer.pending[job.job_id] = job
+        writer._write(jobs)
+
+        self.assertEqual(['a', 'c'], writer.stored)
+        self.assertEqual(None, writer.get('b'))
+        self.assertEqual(None, writer.getFailed('a'))
+
+        failed = writer.getFailed('b')
+        self.assertEqual('FAILED', failed.job_state)
+        self.assertTrue('Can not store b' in failed.reason)
+        self.assertEqual('FAILED', failed.files[0].file_state)
+
+        stats = writer.stats()
+        self.assertEqual(2, stats['written'])
+        self.assertEqual(1, stats['failed'])
+        self.assertEqual(1, stats['failed_kept'])
+
+
+    def test_failed_bounded(self):
+        writer = FakeWriter(['a', 'b', 'c'], maxFailed = 2)
+        writer._write(map(_job, ['a', 'b', 'c']))
+
+        self.assertEqual(None, writer.getFailed('a'))
+        self.assertNotEqual(None, writer.getFailed('b'))
+        self.assertNotEqual(None, writer.getFailed('c'))
+        self.assertEqual(3, writer.stats()['failed'])
+        self.assertEqual(2, writer.stats()['failed_kept'])